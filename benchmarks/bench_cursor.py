@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Compare converting a /query result in kylindb.Cursor.execute with the
+per-column converter plan against the former per-cell conversion.
+
+The result reuses the column metas of the v4 query fixture with a mix of
+column types, every cell a string the way Kylin sends them.
+
+    python benchmarks/bench_cursor.py --rows 50000 --columns 30
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import json
+import os.path
+import timeit
+
+from kylinpy.kylindb import Cursor
+from kylinpy.utils.compat import as_unicode
+from kylinpy.utils.kylin_types import kylin_to_python
+
+here = os.path.abspath(os.path.dirname(__file__))
+COLUMNS = [
+    ('VARCHAR(256)', 'FP-GTC'),
+    ('BIGINT NOT NULL', '10000'),
+    ('DECIMAL(19, 4)', '12.3456'),
+    ('DATE', '2012-01-01'),
+    ('VARCHAR', 'Auction'),
+    ('BOOLEAN', 'true'),
+    ('INTEGER', None),
+    ('VARCHAR(64)', '中文'),
+]
+
+
+def query_result(rows, columns):
+    fixture = os.path.join(here, '..', 'tests', 'fixtures', 'v4', 'query.json')
+    with open(fixture) as f:
+        column_meta = json.load(f)['data']['columnMetas'][0]
+    types = [COLUMNS[col % len(COLUMNS)] for col in range(columns)]
+    return {
+        'columnMetas': [
+            dict(column_meta, label='COL_{}'.format(col), columnTypeName=_type)
+            for (col, (_type, _)) in enumerate(types)
+        ],
+        'results': [[cell for (_, cell) in types] for _ in range(rows)],
+    }
+
+
+class _Connection(object):
+    stream_results = False
+    query_page_size = 0
+
+    def __init__(self, result):
+        self.result = result
+
+    def query(self, sql, **parameters):
+        return self.result
+
+
+def per_cell(resp):
+    """The conversion Cursor.execute did before the converter plan."""
+    column_metas = resp.get('columnMetas')
+
+    def description():
+        return tuple([
+            as_unicode(c['label']),
+            c['columnTypeName'].lower(),
+            c['displaySize'],
+            None,
+            c['precision'],
+            c['scale'],
+            c['isNullable'],
+        ] for c in column_metas)
+
+    return [tuple([
+        kylin_to_python(description()[col][1], cell)
+        for (col, cell) in enumerate(row)
+    ]) for row in resp['results']]
+
+
+def planned(resp):
+    cursor = Cursor(_Connection(resp))
+    cursor.execute('select')
+    return cursor.fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--columns', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    resp = query_result(args.rows, args.columns)
+    assert per_cell(resp) == planned(resp)
+    print('result: {} rows x {} columns'.format(args.rows, args.columns))
+    print('{:<10} {:>12} {:>10}'.format('convert', 'time (ms)', 'speedup'))
+
+    baseline = None
+    for name, convert in (('per_cell', per_cell), ('planned', planned)):
+        elapsed = min(timeit.repeat(lambda: convert(resp), number=1, repeat=args.repeat)) * 1000
+        baseline = baseline or elapsed
+        print('{:<10} {:>12.1f} {:>9.2f}x'.format(name, elapsed, baseline / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Compare fetching a result in limit/offset windows one at a time against
+fetching several windows at once the way Kylin.export does.
+
+Each /query round trip is simulated with a fixed latency, the rows are
+served from memory.
+
+    python benchmarks/bench_export.py --rows 200000 --page-size 10000 --latency 0.05
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import time
+import timeit
+
+from kylinpy.service._query_pages import QueryPages
+
+
+def query_server(rows, latency):
+    result = [[str(i), 'FP-GTC', '12.3456'] for i in range(rows)]
+
+    def query(sql, limit, offset):
+        time.sleep(latency)
+        return {'columnMetas': [], 'results': result[offset:offset + limit]}
+    return query
+
+
+def export(query, page_size, workers):
+    num_rows = 0
+    for rows in QueryPages(query, 'select id from kylin_sales order by id', page_size, prefetch=workers).iter_pages():
+        num_rows += len(rows)
+    return num_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--page-size', type=int, default=10000)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    query = query_server(args.rows, args.latency)
+    print('result: {} rows in windows of {}, {:.0f} ms per request'.format(
+        args.rows, args.page_size, args.latency * 1000))
+    print('{:<10} {:>12} {:>10}'.format('workers', 'time (ms)', 'speedup'))
+
+    baseline = None
+    for workers in (0, 1, 4, 8):
+        assert export(query, args.page_size, workers) == args.rows
+        elapsed = min(timeit.repeat(
+            lambda: export(query, args.page_size, workers), number=1, repeat=args.repeat)) * 1000
+        baseline = baseline or elapsed
+        print('{:<10} {:>12.1f} {:>9.2f}x'.format(workers, elapsed, baseline / elapsed))
+
+
+if __name__ == '__main__':
+    main()
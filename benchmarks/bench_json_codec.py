@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the JSON codecs in kylinpy.utils.json_codec on /query payloads.
+
+The payload reuses the column metas of the v4 query fixture and fills
+`results` the way Kylin does, every cell serialized as a string.
+
+    python benchmarks/bench_json_codec.py --rows 50000 --columns 30
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import json
+import os.path
+import timeit
+
+from kylinpy.utils.json_codec import available_codecs, get_codec
+
+here = os.path.abspath(os.path.dirname(__file__))
+CELLS = ['2012-01-01', 'FP-GTC', '12.3456', '10000', 'Auction', 'true', None, '中文']
+
+
+def query_payload(rows, columns):
+    fixture = os.path.join(here, '..', 'tests', 'fixtures', 'v4', 'query.json')
+    with open(fixture) as f:
+        response = json.load(f)
+    data = response['data']
+    column_meta = data['columnMetas'][0]
+    data['columnMetas'] = [dict(column_meta, label='COL_{}'.format(i)) for i in range(columns)]
+    data['results'] = [
+        [CELLS[(row + col) % len(CELLS)] for col in range(columns)]
+        for row in range(rows)
+    ]
+    return json.dumps(response).encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--columns', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    payload = query_payload(args.rows, args.columns)
+    obj = json.loads(payload.decode('utf-8'))
+    print('payload: {} rows x {} columns, {:.1f} MB'.format(args.rows, args.columns, len(payload) / 1e6))
+    print('{:<8} {:>12} {:>12} {:>10}'.format('codec', 'loads (ms)', 'dumps (ms)', 'speedup'))
+
+    baseline = None
+    for name in reversed(available_codecs()):
+        codec = get_codec(name)
+        loads = min(timeit.repeat(lambda: codec.loads(payload), number=1, repeat=args.repeat)) * 1000
+        dumps = min(timeit.repeat(lambda: codec.dumps(obj), number=1, repeat=args.repeat)) * 1000
+        baseline = baseline or loads
+        print('{:<8} {:>12.1f} {:>12.1f} {:>9.2f}x'.format(name, loads, dumps, baseline / loads))
+
+
+if __name__ == '__main__':
+    main()
@@ -5,9 +5,14 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 from .kylinpy import Kylin, create_kylin, KylinCluster, dsn_proxy
+from .utils.compat import PY3
 
 __version__ = '2.8.5'
 
 __all__ = [
     'Kylin', 'create_kylin', 'KylinCluster', 'dsn_proxy',
 ]
+
+if PY3:
+    from .async_kylin import AsyncKylin, create_async_kylin  # noqa
+    __all__ += ['AsyncKylin', 'create_async_kylin']
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import asyncio
+
+from kylinpy.client.async_client import AsyncClient, AsyncConnectionPool
+from kylinpy.datasource import TableSource, CubeSource, KE4ModelSource
+from kylinpy.exceptions import KylinCubeError, UnsupportApiError
+from kylinpy.kylinpy import Kylin, _parse_dsn
+from kylinpy.service.async_service import AsyncKylinService, AsyncKE3Service, AsyncKE4Service
+
+ASYNC_SERVICES = {
+    'v1': AsyncKylinService,
+    'v2': AsyncKE3Service,
+    'v4': AsyncKE4Service,
+}
+
+
+class AsyncKylin(Kylin):
+    """
+    asyncio version of `Kylin`, the metadata and query methods are coroutines.
+
+    Datasources returned by `get_datasource()` keep the synchronous service,
+    so build and segment maintenance calls on them still block.
+    """
+
+    def __init__(self, host, username=None, password=None, port=7070, project=None, **connect_args):
+        super(AsyncKylin, self).__init__(host, username, password, port, project, **connect_args)
+        self.async_pool = AsyncConnectionPool(maxsize=self.pool_maxsize, idle_timeout=self.pool_idle_timeout)
+
+    @property
+    def service(self):
+        return self._get_cached(
+            'async_service',
+            lambda: ASYNC_SERVICES[self.version](self._get_async_client(), self.project, cache=self.metadata_cache),
+        )
+
+    @property
+    def sync_service(self):
+        return super(AsyncKylin, self).service
+
+    def _get_async_client(self):
+        headers = self._get_headers()
+        session = self._get_session()
+        login_client = None
+        if session is not None:
+            headers.pop('Authorization', None)
+            login_client = self._get_client()
+        return AsyncClient(
+            host='{self.scheme}://{self.host}:{self.port}'.format(**locals()),
+            prefix=self.prefix,
+            timeout=self.timeout,
+            request_headers=headers,
+            unverified=self.unverified,
+            is_debug=self.is_debug,
+            keep_alive=self.keep_alive,
+            pool=self.async_pool if self.keep_alive else None,
+            compression=self.compression,
+            stats=self.transfer_stats,
+            codec=self.json_codec,
+            nodes=self.node_set,
+            retry=self.retry_policy,
+            breakers=self.breakers,
+            limits=self.limits,
+            hooks=self.hooks,
+            session=session,
+            login_client=login_client,
+        )
+
+    async def close(self):
+        await self.async_pool.close()
+        super(AsyncKylin, self).close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def projects(self):
+        return await self.service.projects()
+
+    async def query(self, sql, **parameters):
+        return await self.service.query(sql, **parameters)
+
+    async def _full_table_names(self):
+        if self.is_pushdown:
+            return sorted(list((await self.service.tables_in_hive()).keys()))
+        return sorted(list((await self.service.tables_and_columns()).keys()))
+
+    async def get_all_tables(self, schema=None):
+        _full_names = await self._full_table_names()
+        if schema:
+            _full_names = [t for t in _full_names if t.split('.')[0] == schema]
+        return [t.split('.')[1] for t in _full_names]
+
+    async def get_all_schemas(self):
+        _full_names = await self._full_table_names()
+        return list(set(t.split('.')[0] for t in _full_names))
+
+    async def get_table_source(self, name, schema=None):
+        if '.' in name:
+            schema, name = name.split('.', 1)
+        fullname = '{}.{}'.format(schema, name)
+        if self.is_pushdown:
+            return TableSource(name, schema, (await self.service.tables_in_hive()).get(fullname))
+        else:
+            return TableSource(name, schema, (await self.service.tables_and_columns()).get(fullname))
+
+    async def get_datasource(self, name):
+        service = self.service
+        if self.version == 'v4':
+            model_desc, tables_and_columns = await asyncio.gather(
+                service.model(name),
+                service.tables_and_columns(),
+            )
+            return KE4ModelSource(
+                model_desc=model_desc,
+                tables_and_columns=tables_and_columns,
+                service=self.sync_service,
+            )
+
+        cube_desc = await service.cube_desc(name)
+        if cube_desc is None:
+            raise KylinCubeError('No Cube found: {}'.format(name))
+        model_desc, tables_and_columns = await asyncio.gather(
+            service.model_desc(cube_desc.get('model_name')),
+            service.tables_and_columns(),
+        )
+        return CubeSource(
+            cube_desc=cube_desc,
+            model_desc=model_desc,
+            tables_and_columns=tables_and_columns,
+            service=self.sync_service,
+        )
+
+    async def list_datasources(self):
+        if self.version == 'v4':
+            return [models.get('name') for models in await self.service.models()]
+        return [cube.get('name') for cube in await self.service.cubes()]
+
+    async def jobs(self, **query_params):
+        return await self.service.jobs(**query_params)
+
+    def get_job(self, job_id):
+        raise UnsupportApiError('Jobs are not supported by AsyncKylin, use Kylin.get_job()')
+
+    def list_job(self, **query_params):
+        raise UnsupportApiError('Jobs are not supported by AsyncKylin, use AsyncKylin.jobs()')
+
+    def __repr__(self):
+        return '<AsyncKylinpy instance: {}>'.format(str(self))
+
+
+def create_async_kylin(dsn):
+    args, query = _parse_dsn(dsn)
+    return AsyncKylin(*args, **query)
@@ -18,4 +18,7 @@ from .exceptions import (  # noqa
     InternalServerError,
     ServiceUnavailableError,
     GatewayTimeoutError,
+    CircuitOpenError,
+    LimitTimeoutError,
+    ReadTimeoutError,
 )
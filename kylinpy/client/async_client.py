@@ -0,0 +1,464 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import asyncio
+import io
+import time
+from collections import deque
+from http.client import HTTPMessage
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlsplit
+from urllib.request import Request
+
+from kylinpy.client.client import Client, Response, IDEMPOTENT_METHODS, NODE_ERRORS
+from kylinpy.client.compression import CHUNK_SIZE, DecodedStream, content_encoding
+from kylinpy.client.exceptions import (
+    CircuitOpenError,
+    LimitTimeoutError,
+    ReadTimeoutError,
+    UnauthorizedError,
+    handle_error,
+)
+from kylinpy.client.hooks import RequestTrace
+from kylinpy.client.pool import get_ssl_context
+from kylinpy.client.retry import is_read_timeout
+from kylinpy.logger import logger
+from kylinpy.utils.json_codec import get_codec
+
+
+class _StaleConnectionError(Exception):
+    pass
+
+
+class _CookieResponse(object):
+    """What `CookieJar.extract_cookies` reads of a response."""
+
+    def __init__(self, response):
+        self._headers = response.headers
+
+    def info(self):
+        return self._headers
+
+
+class _LoopWaiter(object):
+    """`FairSemaphore` waiter of a coroutine, the slot may be handed over from any thread."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.future = loop.create_future()
+
+    def set(self):
+        self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+async def acquire_limiter(limiter):
+    """
+    `Limiter.acquire` for coroutines: waits on the event loop, no thread is
+    held while waiting in line, and a cancelled waiter gives back its slot.
+    """
+    deadline = time.time() + limiter.max_wait
+    bucket, semaphore = limiter.bucket, limiter.semaphore
+    if bucket is not None:
+        wait = bucket.reserve(limiter.max_wait)
+        if wait is None:
+            raise LimitTimeoutError(limiter.name, 'rate')
+        try:
+            await asyncio.sleep(wait)
+        except BaseException:
+            bucket.refund()
+            raise
+    if semaphore is None:
+        return
+
+    waiter = _LoopWaiter(asyncio.get_event_loop())
+    if semaphore.enqueue(waiter):
+        return
+    try:
+        await asyncio.wait_for(waiter.future, max(0.0, deadline - time.time()))
+    except BaseException as err:
+        if not semaphore.discard(waiter):
+            # the slot was handed over while timing out or being cancelled, pass it on
+            semaphore.release()
+        if bucket is not None:
+            bucket.refund()
+        if isinstance(err, asyncio.TimeoutError):
+            raise LimitTimeoutError(limiter.name, 'concurrency')
+        raise
+
+
+class AsyncResponse(Response):
+    def __init__(self, status_code, url, headers, body, codec=None):
+        # the body arrives already decoded, so the urllib based __init__ is skipped
+        self._codec = codec or get_codec()
+        self._status_code = status_code
+        self._headers = headers
+        self._url = url
+        self._raw = None
+        self._body = body
+
+
+class AsyncConnectionPool(object):
+    """Keep-alive stream connections for one event loop, per host."""
+
+    def __init__(self, maxsize=10, idle_timeout=60):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.num_connections = 0
+        self.num_requests = 0
+        self._idle = {}
+        self._loop = None
+
+    async def get(self, scheme, host, port, unverified=False):
+        """
+        :return: tuple of ((reader, writer), is_reused)
+        """
+        loop = asyncio.get_event_loop()
+        if loop is not self._loop:
+            # streams are bound to the loop that opened them, e.g. across asyncio.run() calls
+            self._idle, self._loop = {}, loop
+        self.num_requests += 1
+        idle = self._idle.get((scheme, host, port, bool(unverified)))
+        deadline = time.time() - self.idle_timeout
+        while idle:
+            reader, writer, released_at = idle.pop()
+            if released_at < deadline or reader.at_eof() or writer.is_closing():
+                writer.close()
+                continue
+            return (reader, writer), True
+        return await self.new_connection(scheme, host, port, unverified), False
+
+    async def new_connection(self, scheme, host, port, unverified=False):
+        ssl_context = get_ssl_context(unverified) if scheme == 'https' else None
+        reader, writer = await asyncio.open_connection(host, port, ssl=ssl_context)
+        self.num_connections += 1
+        return reader, writer
+
+    def put(self, scheme, host, port, unverified, conn):
+        reader, writer = conn
+        idle = self._idle.setdefault((scheme, host, port, bool(unverified)), deque())
+        if len(idle) < self.maxsize:
+            idle.append((reader, writer, time.time()))
+        else:
+            writer.close()
+
+    @property
+    def num_idle(self):
+        return sum(len(idle) for idle in self._idle.values())
+
+    async def close(self):
+        idle, self._idle = self._idle, {}
+        if self._loop is not None and self._loop.is_closed():
+            return
+        for conns in idle.values():
+            for _, writer, _ in conns:
+                writer.close()
+
+
+class AsyncClient(Client):
+    """asyncio counterpart of `Client`, `get`/`post`/`put`/`delete` return coroutines."""
+
+    def __init__(self, host, pool=None, keep_alive=True, login_client=None, **kwargs):
+        """
+        :param login_client: sync `Client` with the same `session`, logging in to the nodes
+        """
+        if pool is None and keep_alive:
+            pool = AsyncConnectionPool()
+        super(AsyncClient, self).__init__(host, keep_alive=keep_alive, pool=pool, **kwargs)
+        self.login_client = login_client
+
+    async def _request(self, method, endpoint,
+                       params=None, json=None, headers=None, timeout=None):
+        method = method.upper()
+        request_data = self.codec.dumps(json) if json else None
+        request_headers = self._merge_headers(headers, request_data)
+
+        trace = RequestTrace(method, endpoint) if self.hooks else None
+        attempt = 1
+        while True:
+            try:
+                response = await self._dispatch(
+                    method, endpoint, params, request_headers, request_data, timeout, trace)
+                break
+            except Exception as err:
+                if self.retry is None or not self.retry.should_retry(method, err, attempt):
+                    raise
+                delay = self.retry.backoff(attempt, err)
+                self.retry.record(method, endpoint)
+                logger.warning('{} {} failed: {!r}, retry {} in {:.2f}s'.format(method, endpoint, err, attempt, delay))
+                if trace is not None:
+                    trace.retry_delay = delay
+                    self.hooks.emit('on_retry', trace)
+                await asyncio.sleep(delay)
+                attempt += 1
+
+        if trace is not None:
+            trace.total = time.time() - trace.started
+            self.hooks.emit('after_response', trace)
+        return response
+
+    async def _dispatch(self, method, endpoint, params, request_headers, request_data, timeout, trace=None):
+        if self.nodes is None:
+            return await self._send_to(
+                method, self.host, endpoint, params, request_headers, request_data, timeout, trace)
+
+        tried = []
+        while True:
+            node = self.nodes.acquire(exclude=tried)
+            started = time.time()
+            try:
+                response = await self._send_to(
+                    method, node.url, endpoint, params, request_headers, request_data, timeout, trace)
+            except NODE_ERRORS as err:
+                if is_read_timeout(err):
+                    self.nodes.release(node, time.time() - started)
+                    raise
+                self.nodes.release(node, failed=True)
+                tried.append(node)
+                if method not in IDEMPOTENT_METHODS or len(tried) >= len(self.nodes):
+                    raise
+                logger.warning('{} {} failed on {}: {!r}, failing over'.format(method, endpoint, node.url, err))
+                continue
+            except Exception:
+                self.nodes.release(node, time.time() - started)
+                raise
+            self.nodes.release(node, time.time() - started)
+            return response
+
+    async def _send_to(self, method, host, endpoint, params, request_headers, request_data, timeout, trace=None):
+        url = self._build_url(endpoint, params, host=host)
+        session = self.session
+        if session is None:
+            return await self._traced_fetch(host, method, url, request_headers, request_data, timeout, trace)
+
+        generation = session.node(host).generation
+        if not generation:
+            await self._login(host)
+            generation = session.node(host).generation
+        try:
+            response = await self._traced_fetch(
+                host, method, url, self._session_headers(host, url, request_headers), request_data, timeout, trace)
+        except UnauthorizedError:
+            # the node's session expired or it restarted, log in to it again and replay there once
+            await self._login(host, generation)
+            response = await self._traced_fetch(
+                host, method, url, self._session_headers(host, url, request_headers), request_data, timeout, trace)
+        session.node(host).cookies.extract_cookies(_CookieResponse(response), Request(url))
+        return response
+
+    async def _login(self, host, generation=0):
+        # logins go through the sync `login_client`, serialized with the threads sharing the session
+        await asyncio.get_event_loop().run_in_executor(
+            None, self.session.login, self.login_client, host, generation)
+
+    def _session_headers(self, host, url, request_headers):
+        headers = dict(request_headers)
+        headers.update(self.session.headers(host))
+        request = Request(url)
+        self.session.node(host).cookies.add_cookie_header(request)
+        cookie = request.get_header('Cookie')
+        if cookie:
+            headers['Cookie'] = cookie
+        return headers
+
+    async def _traced_fetch(self, host, method, url, request_headers, request_data, timeout, trace):
+        if trace is None:
+            return await self._guarded_fetch(host, method, url, request_headers, request_data, timeout)
+
+        # the body is read along with the headers, so ttfb covers the whole exchange here
+        trace.start_attempt(host, url, request_headers, request_data)
+        self.hooks.emit('before_request', trace)
+        try:
+            response = await self._guarded_fetch(host, method, url, request_headers, request_data, timeout)
+        except Exception as err:
+            trace.ttfb = time.time() - trace.sent
+            trace.status_code = getattr(err, 'status_code', None)
+            trace.error = err
+            self.hooks.emit('on_error', trace)
+            raise
+        trace.ttfb = time.time() - trace.sent
+        trace.status_code = response.status_code
+        trace.response_bytes = len(response.body)
+        return response
+
+    async def _guarded_fetch(self, host, method, url, request_headers, request_data, timeout):
+        if self.breakers is None:
+            return await self._limited_fetch(host, method, url, request_headers, request_data, timeout)
+
+        breaker = self.breakers.get(host)
+        if not breaker.allow():
+            raise CircuitOpenError(host)
+        recorded = False
+        try:
+            response = await self._limited_fetch(host, method, url, request_headers, request_data, timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            if self.breakers.is_failure(err):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            recorded = True
+            raise
+        else:
+            breaker.record_success()
+            recorded = True
+        finally:
+            # cancelled or interrupted, the request says nothing about the host
+            if not recorded:
+                breaker.cancel()
+        return response
+
+    async def _limited_fetch(self, host, method, url, request_headers, request_data, timeout):
+        if not self.limits:
+            return await self._fetch(method, url, request_headers, request_data, timeout)
+
+        limiter = self.limits.limiter(host)
+        await acquire_limiter(limiter)
+        try:
+            return await self._fetch(method, url, request_headers, request_data, timeout)
+        finally:
+            limiter.release()
+
+    async def _fetch(self, method, url, request_headers, request_data, timeout):
+        sent = []
+        try:
+            status, reason, response_headers, body = await asyncio.wait_for(
+                self._send(method, url, request_headers, request_data, sent),
+                timeout or self.timeout,
+            )
+        except asyncio.TimeoutError as err:
+            # once the request is out the node may still be running it
+            raise ReadTimeoutError(err) if sent else URLError(err)
+        except (asyncio.IncompleteReadError, ConnectionError) as err:
+            raise URLError(err)
+
+        if status >= 400:
+            exc = handle_error(HTTPError(url, status, reason, response_headers, io.BytesIO(body)))
+            exc.__cause__ = None
+            raise exc
+        return AsyncResponse(status, url, response_headers, body, codec=self.codec)
+
+    async def _send(self, method, url, headers, body, sent=None):
+        parts = urlsplit(url)
+        scheme = parts.scheme
+        port = parts.port or (443 if scheme == 'https' else 80)
+        target = '{}?{}'.format(parts.path or '/', parts.query) if parts.query else (parts.path or '/')
+
+        headers = dict(headers)
+        headers['Host'] = parts.netloc
+        headers['Connection'] = 'keep-alive' if self.keep_alive else 'close'
+        if body is not None or method in ('POST', 'PUT'):
+            headers['Content-Length'] = str(len(body or b''))
+        head = '\r\n'.join(
+            ['{} {} HTTP/1.1'.format(method, target)]
+            + ['{}: {}'.format(key, value) for (key, value) in headers.items()],
+        )
+        data = head.encode('latin-1') + b'\r\n\r\n' + (body or b'')
+
+        conn, is_reused = await self._connect(scheme, parts.hostname, port)
+        try:
+            try:
+                rv, will_close = await self._exchange(conn, method, data, sent)
+            except _StaleConnectionError:
+                conn[1].close()
+                if not is_reused:
+                    raise
+                # the server closed an idle keep-alive connection, retry on a new one
+                conn = await self._connect(scheme, parts.hostname, port, fresh=True)
+                rv, will_close = await self._exchange(conn, method, data, sent)
+        except _StaleConnectionError as err:
+            conn[1].close()
+            raise URLError(err.args[0])
+        except BaseException:
+            conn[1].close()
+            raise
+
+        if self.keep_alive and not will_close:
+            self.pool.put(scheme, parts.hostname, port, self.unverified, conn)
+        else:
+            conn[1].close()
+        return rv
+
+    async def _connect(self, scheme, host, port, fresh=False):
+        try:
+            if not self.keep_alive:
+                ssl_context = get_ssl_context(self.unverified) if scheme == 'https' else None
+                return await asyncio.open_connection(host, port, ssl=ssl_context), False
+            if fresh:
+                return await self.pool.new_connection(scheme, host, port, self.unverified)
+            return await self.pool.get(scheme, host, port, self.unverified)
+        except OSError as err:
+            raise URLError(err)
+
+    async def _exchange(self, conn, method, data, sent=None):
+        reader, writer = conn
+        try:
+            writer.write(data)
+            await writer.drain()
+            if sent is not None:
+                sent.append(True)
+            status_line = await reader.readline()
+        except ConnectionError as err:
+            raise _StaleConnectionError(err)
+        if not status_line:
+            raise _StaleConnectionError(ConnectionResetError('Remote end closed connection without response'))
+
+        version, status, reason = (status_line.decode('latin-1').rstrip('\r\n').split(' ', 2) + [''])[:3]
+        status = int(status)
+        headers = HTTPMessage()
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip()] = value.strip()
+
+        # error bodies are decoded later by `HTTPError`, like the ones from urllib
+        decoder = DecodedStream(None, content_encoding(headers), self.stats) if status < 400 else None
+        body = io.BytesIO()
+        will_close = version == 'HTTP/1.0' or headers.get('Connection', '').lower() == 'close'
+
+        def feed(chunk):
+            body.write(decoder.decode(chunk) if decoder else chunk)
+
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            pass
+        elif 'chunked' in headers.get('Transfer-Encoding', '').lower():
+            while True:
+                size = int((await reader.readline()).split(b';')[0].strip(), 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                feed(await reader.readexactly(size))
+                await reader.readexactly(2)
+        elif headers.get('Content-Length') is not None:
+            remaining = int(headers.get('Content-Length'))
+            while remaining > 0:
+                chunk = await reader.read(min(remaining, CHUNK_SIZE))
+                if not chunk:
+                    raise URLError(ConnectionResetError('Connection closed while reading the response body'))
+                remaining -= len(chunk)
+                feed(chunk)
+        else:
+            will_close = True
+            while True:
+                chunk = await reader.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                feed(chunk)
+
+        if decoder is not None:
+            body.write(decoder.flush())
+        return (status, reason, headers, body.getvalue()), will_close
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
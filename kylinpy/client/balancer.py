@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import itertools
+import socket
+import threading
+
+from kylinpy.logger import logger
+from kylinpy.utils.compat import string_types, urlparse
+
+
+class Node(object):
+    """One Kylin query node, with the load and latency seen by this process."""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        parts = urlparse(self.url)
+        self.address = (parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+        self.outstanding = 0
+        self.ewma = 0.0
+        self.healthy = True
+        self.failures = 0
+
+    def __repr__(self):
+        return '<Node {} healthy={} outstanding={} ewma={:.3f}s>'.format(
+            self.url, self.healthy, self.outstanding, self.ewma)
+
+
+class RoundRobinBalancer(object):
+    name = 'round_robin'
+
+    def __init__(self):
+        self._counter = itertools.count()
+
+    def select(self, nodes):
+        return nodes[next(self._counter) % len(nodes)]
+
+
+class LeastOutstandingBalancer(RoundRobinBalancer):
+    name = 'least_outstanding'
+
+    def select(self, nodes):
+        # rotate the start so that ties do not always land on the first node
+        offset = next(self._counter) % len(nodes)
+        nodes = nodes[offset:] + nodes[:offset]
+        return min(nodes, key=lambda node: node.outstanding)
+
+
+class EWMABalancer(RoundRobinBalancer):
+    name = 'ewma'
+
+    def select(self, nodes):
+        offset = next(self._counter) % len(nodes)
+        nodes = nodes[offset:] + nodes[:offset]
+        # nodes without a measurement score 0 and get picked first
+        return min(nodes, key=lambda node: node.ewma * (node.outstanding + 1))
+
+
+BALANCERS = {
+    'round_robin': RoundRobinBalancer,
+    'least_outstanding': LeastOutstandingBalancer,
+    'ewma': EWMABalancer,
+}
+
+
+def get_balancer(name=None):
+    """
+    :param name: 'round_robin' (default), 'least_outstanding' or 'ewma'
+    """
+    name = name or 'round_robin'
+    if name not in BALANCERS:
+        raise ValueError('Unknown balancer: {}, expected one of {}'.format(name, sorted(BALANCERS)))
+    return BALANCERS[name]()
+
+
+class NodeSet(object):
+    """
+    Query nodes shared by every `Client` of a `Kylin` instance.
+
+    Nodes that fail a request are taken out of rotation until a health
+    probe (a TCP connect, run every `health_check_interval` seconds on a
+    daemon thread) reaches them again.
+    """
+
+    def __init__(self, urls, balancer=None, health_check_interval=10, health_check_timeout=2, decay=0.3):
+        if not urls:
+            raise ValueError('NodeSet needs at least one node')
+        self.nodes = [Node(url) for url in urls]
+        self.balancer = get_balancer(balancer) if balancer is None or isinstance(balancer, string_types) else balancer
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        self.decay = decay
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._prober = None
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @property
+    def healthy_nodes(self):
+        return [node for node in self.nodes if node.healthy]
+
+    def acquire(self, exclude=()):
+        """
+        :param exclude: nodes already tried for this request
+        :return: the node to send the request to, or None when all are excluded
+        """
+        self._start_prober()
+        with self._lock:
+            candidates = [node for node in self.nodes if node not in exclude]
+            # when every node is down, keep trying them rather than failing without a request
+            candidates = [node for node in candidates if node.healthy] or candidates
+            if not candidates:
+                return None
+            node = self.balancer.select(candidates)
+            node.outstanding += 1
+            return node
+
+    def release(self, node, elapsed=None, failed=False):
+        with self._lock:
+            node.outstanding -= 1
+            if failed:
+                node.failures += 1
+                if node.healthy:
+                    logger.warning('Kylin node {} is marked down'.format(node.url))
+                node.healthy = False
+            elif elapsed is not None:
+                node.ewma = elapsed if node.ewma == 0 else (1 - self.decay) * node.ewma + self.decay * elapsed
+                node.failures = 0
+                node.healthy = True
+
+    def probe(self):
+        for node in self.nodes:
+            try:
+                socket.create_connection(node.address, timeout=self.health_check_timeout).close()
+            except (socket.error, socket.timeout):
+                healthy = False
+            else:
+                healthy = True
+            with self._lock:
+                if healthy and not node.healthy:
+                    logger.info('Kylin node {} is back up'.format(node.url))
+                node.healthy = healthy
+
+    def _start_prober(self):
+        if self._prober is not None or not self.health_check_interval or len(self.nodes) < 2:
+            return
+        with self._lock:
+            if self._prober is not None:
+                return
+            self._prober = threading.Thread(target=self._probe_forever, name='kylinpy-health-check')
+            self._prober.daemon = True
+            self._prober.start()
+
+    def _probe_forever(self):
+        while not self._stopped.wait(self.health_check_interval):
+            self.probe()
+
+    def close(self):
+        self._stopped.set()
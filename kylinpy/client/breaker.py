@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import threading
+import time
+
+from kylinpy.client.exceptions import CircuitOpenError, HTTPError
+from kylinpy.client.retry import CONNECTION_ERRORS
+from kylinpy.logger import logger
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker(object):
+    """
+    closed: requests go through, consecutive failures are counted.
+    open: requests fail fast with `CircuitOpenError` for `reset_timeout` seconds.
+    half_open: a single trial request is let through, its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, host, failure_threshold=5, reset_timeout=30):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._state = CLOSED
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.time() - self.opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self):
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if time.time() - self.opened_at < self.reset_timeout:
+                    return False
+                self._state = HALF_OPEN
+            if self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info('Circuit breaker for {} is closed'.format(self.host))
+            self._state = CLOSED
+            self._trial = False
+            self.failures = 0
+
+    def cancel(self):
+        # the trial request was abandoned without an outcome, let another one through
+        with self._lock:
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self._state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    logger.warning('Circuit breaker for {} is open after {} failures'.format(
+                        self.host, self.failures))
+                self._state = OPEN
+                self.opened_at = time.time()
+
+
+class CircuitBreakers(object):
+    """
+    One `CircuitBreaker` per host. Timeouts, connection errors and the
+    `failure_statuses` responses count as failures; 500 does not, since
+    Kylin answers invalid SQL with it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, failure_statuses=(502, 503, 504)):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failure_statuses = frozenset(failure_statuses)
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, host):
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(
+                    host, CircuitBreaker(host, self.failure_threshold, self.reset_timeout))
+        return breaker
+
+    def is_failure(self, error):
+        if isinstance(error, HTTPError):
+            return getattr(error, 'status_code', None) in self.failure_statuses
+        return isinstance(error, CONNECTION_ERRORS) and not isinstance(error, CircuitOpenError)
+
+    @property
+    def states(self):
+        """
+        :return: dict of host to 'closed', 'open' or 'half_open'
+        """
+        return {host: breaker.state for (host, breaker) in list(self._breakers.items())}
@@ -4,23 +4,47 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-import json as _json
-import ssl
+import threading
+import time
 
 from kylinpy.utils.compat import urllib
 from kylinpy.utils.compat import HTTPSHandler
 from kylinpy.utils.compat import urlencode
+from kylinpy.utils.compat import urlparse
 from kylinpy.utils.compat import HTTPError
-from kylinpy.client.exceptions import handle_error
+from kylinpy.client.compression import ACCEPT_ENCODING, TransferStats, decoded_stream
+from kylinpy.client.exceptions import (
+    handle_error,
+    CircuitOpenError,
+    ServiceUnavailableError,
+    GatewayTimeoutError,
+    LimitTimeoutError,
+    UnauthorizedError,
+)
+from kylinpy.client.hooks import Hooks, RequestTrace, debug_log_hook
+from kylinpy.client.retry import IDEMPOTENT_METHODS, CONNECTION_ERRORS, is_read_timeout
+from kylinpy.client.session import SessionCookieProcessor
+from kylinpy.client.pool import (
+    PoolManager,
+    KeepAliveHTTPHandler,
+    KeepAliveHTTPSHandler,
+    get_ssl_context,
+)
 from kylinpy.logger import logger
+from kylinpy.utils.json_codec import get_codec
+
+# errors after which a node is taken out of rotation, except read timeouts (see `is_read_timeout`)
+NODE_ERRORS = CONNECTION_ERRORS + (ServiceUnavailableError, GatewayTimeoutError)
 
 
 class Response(object):
-    def __init__(self, response):
+    def __init__(self, response, stats=None, stream=False, codec=None):
+        self._codec = codec or get_codec()
         self._status_code = response.getcode()
-        self._body = response.read()
         self._headers = response.info()
         self._url = response.url
+        self._raw = decoded_stream(response, self._headers, stats)
+        self._body = None if stream else self._raw.read()
 
     @property
     def status_code(self):
@@ -30,8 +54,17 @@ class Response(object):
     def url(self):
         return self._url
 
+    @property
+    def raw(self):
+        """
+        :return: file-like body, only for responses requested with `stream=True`
+        """
+        return self._raw
+
     @property
     def body(self):
+        if self._body is None:
+            self._body = self._raw.read()
         return self._body
 
     @property
@@ -40,7 +73,7 @@ class Response(object):
 
     def json(self):
         if self.body:
-            return _json.loads(self.body.decode('utf-8'))
+            return self._codec.loads(self.body)
         else:
             return None
 
@@ -56,6 +89,17 @@ class Client(object):
         timeout=None,
         unverified=None,
         is_debug=False,
+        keep_alive=True,
+        pool=None,
+        compression=True,
+        stats=None,
+        codec=None,
+        nodes=None,
+        retry=None,
+        breakers=None,
+        limits=None,
+        hooks=None,
+        session=None,
     ):
         self.host = host.rstrip('/')
         self.request_headers = request_headers or {}
@@ -63,12 +107,31 @@ class Client(object):
         self.timeout = timeout
         self.unverified = unverified
         self.is_debug = is_debug
+        self.keep_alive = keep_alive
+        self.pool = pool
+        self.compression = compression
+        self.stats = stats if stats is not None else TransferStats()
+        self.codec = codec or get_codec()
+        self.nodes = nodes
+        self.retry = retry
+        self.breakers = breakers
+        self.limits = limits
+        if hooks is None:
+            hooks = Hooks()
+            if is_debug:
+                hooks.register('before_request', debug_log_hook(mask_auth=False))
+        self.hooks = hooks
+        self.session = session
+        # (opener_key, opener), swapped in one assignment so threads never see a torn pair
+        self._opener = None
+        self._opener_lock = threading.Lock()
 
-    def _build_url(self, endpoint=None, params=None):
+    def _build_url(self, endpoint=None, params=None, host=None):
+        host = host or self.host
         if self.prefix:
-            url = '{}/{}'.format(self.host, self.prefix.strip('/'))
+            url = '{}/{}'.format(host, self.prefix.strip('/'))
         else:
-            url = self.host
+            url = host
 
         if endpoint:
             url = '{}/{}'.format(url, endpoint.strip('/'))
@@ -80,34 +143,72 @@ class Client(object):
 
         return url
 
-    def _update_headers(self, request_headers):
-        self.request_headers.update(request_headers)
+    def _get_opener(self):
+        opener_key = (bool(self.keep_alive), bool(self.unverified), id(self.session))
+        cached = self._opener
+        if cached is not None and cached[0] == opener_key:
+            return cached[1]
+        with self._opener_lock:
+            cached = self._opener
+            if cached is not None and cached[0] == opener_key:
+                return cached[1]
+            opener = self._build_opener()
+            self._opener = (opener_key, opener)
+            return opener
 
-    def _mask_auth_headers(self, headers):
-        if self.is_debug:
-            return headers
+    def _build_opener(self):
+        handlers = []
+        if self.session is not None:
+            handlers.append(SessionCookieProcessor(self.session))
+        if self.keep_alive:
+            if self.pool is None:
+                self.pool = PoolManager()
+            handlers += [
+                KeepAliveHTTPHandler(self.pool, self.unverified),
+                KeepAliveHTTPSHandler(self.pool, self.unverified),
+            ]
+        elif self.unverified:
+            handlers.append(HTTPSHandler(context=get_ssl_context(unverified=True)))
+        return urllib.build_opener(*handlers)
 
-        _headers = {}
-        for (key, value) in headers.items():
-            if key.lower() == 'authorization':
-                _headers[key] = '******'
-            else:
-                _headers[key] = value
-        return _headers
+    def close(self):
+        if self.pool is not None:
+            self.pool.clear()
+
+    def preconnect(self, count=1):
+        """
+        Open keep-alive connections to each node ahead of the first requests.
+
+        :return: number of connections opened
+        """
+        if not self.keep_alive:
+            return 0
+        # builds the pool manager when the client got none
+        self._get_opener()
+        hosts = [node.url for node in self.nodes.nodes] if self.nodes is not None else [self.host]
+        opened = 0
+        for host in hosts:
+            parts = urlparse(host)
+            pool = self.pool.connection_pool(parts.scheme, parts.netloc, self.unverified)
+            opened += pool.prefill(count, timeout=self.timeout)
+        return opened
+
+    def _merge_headers(self, headers=None, request_data=None):
+        """
+        :return: a new dict of the client's headers with the per-call `headers` on top,
+            `request_headers` itself is never touched, so one client can serve many threads
+        """
+        request_headers = dict(self.request_headers)
+        if headers:
+            request_headers.update(headers)
+        if request_data and ('Content-Type' not in request_headers):
+            request_headers['Content-Type'] = 'application/json'
+        if self.compression and ('Accept-Encoding' not in request_headers):
+            request_headers['Accept-Encoding'] = ACCEPT_ENCODING
+        return request_headers
 
     def _make_request(self, opener, request, timeout=None):
         timeout = timeout or self.timeout
-        logger.debug("""
-==========================[QUERY]===============================
-method: {} 
-url: {} 
-headers: {} 
-body: {}
-==========================[QUERY]===============================""".format(  # noqa
-            request.get_method(),
-            request.get_full_url(),
-            self._mask_auth_headers(dict(request.header_items())),
-            request.data))
         try:
             return opener.open(request, timeout=timeout)
         except HTTPError as err:
@@ -116,30 +217,168 @@ body: {}
             raise exc
 
     def _request(self, method, endpoint,
-                 params=None, json=None, headers=None, timeout=None):
+                 params=None, json=None, headers=None, timeout=None, stream=False):
         method = method.upper()
-        request_data = None
+        request_data = self.codec.dumps(json) if json else None
+        request_headers = self._merge_headers(headers, request_data)
 
-        if headers:
-            self._update_headers(headers)
-        if json:
-            request_data = _json.dumps(json).encode('utf-8')
-
-        if self.unverified:
-            opener = urllib.build_opener(
-                HTTPSHandler(context=ssl._create_unverified_context()),
-            )
-        else:
-            opener = urllib.build_opener()
-        request = urllib.Request(self._build_url(endpoint, params), data=request_data)
-        if self.request_headers:
-            for key, value in self.request_headers.items():
+        opener = self._get_opener()
+        # traces are only built when somebody listens
+        trace = RequestTrace(method, endpoint) if self.hooks else None
+        response = self._retrying_dispatch(
+            opener, method, endpoint, params, request_headers, request_data, timeout, trace)
+
+        if trace is None:
+            return Response(response, stats=self.stats, stream=stream, codec=self.codec)
+        received = time.time()
+        response = Response(response, stats=self.stats, stream=stream, codec=self.codec)
+        if not stream:
+            trace.body = time.time() - received
+            trace.response_bytes = response.raw.compressed_bytes
+        trace.total = time.time() - trace.started
+        self.hooks.emit('after_response', trace)
+        return response
+
+    def _retrying_dispatch(self, opener, method, endpoint, params, request_headers, request_data, timeout, trace):
+        attempt = 1
+        while True:
+            try:
+                return self._dispatch(opener, method, endpoint, params, request_headers, request_data, timeout, trace)
+            except Exception as err:
+                if self.retry is None or not self.retry.should_retry(method, err, attempt):
+                    raise
+                delay = self.retry.backoff(attempt, err)
+                self.retry.record(method, endpoint)
+                logger.warning('{} {} failed: {!r}, retry {} in {:.2f}s'.format(method, endpoint, err, attempt, delay))
+                if trace is not None:
+                    trace.retry_delay = delay
+                    self.hooks.emit('on_retry', trace)
+                time.sleep(delay)
+                attempt += 1
+
+    def _dispatch(self, opener, method, endpoint, params, request_headers, request_data, timeout, trace=None):
+        # logins go to the node being logged in to
+        pinned = self.session.logging_in if self.session is not None else None
+        if self.nodes is None or pinned:
+            return self._send_to(
+                opener, method, pinned or self.host, endpoint, params, request_headers, request_data, timeout, trace)
+        return self._balanced_request(opener, method, endpoint, params, request_headers, request_data, timeout, trace)
+
+    def _send_to(self, opener, method, host, endpoint, params, request_headers, request_data, timeout, trace=None):
+        session = self.session
+        if session is None or session.logging_in:
+            request = self._build_request(method, host, endpoint, params, request_headers, request_data)
+            return self._send(opener, host, request, timeout, trace)
+
+        generation = session.node(host).generation
+        if not generation:
+            session.login(self, host)
+            generation = session.node(host).generation
+        request = self._build_request(method, host, endpoint, params, request_headers, request_data)
+        try:
+            return self._send(opener, host, request, timeout, trace)
+        except UnauthorizedError:
+            # the node's session expired or it restarted, log in to it again and replay there once
+            session.login(self, host, generation)
+            request = self._build_request(method, host, endpoint, params, request_headers, request_data)
+            return self._send(opener, host, request, timeout, trace)
+
+    def _build_request(self, method, host, endpoint, params, request_headers, request_data):
+        request = urllib.Request(self._build_url(endpoint, params, host=host), data=request_data)
+        for key, value in request_headers.items():
+            request.add_header(key, value)
+        if self.session is not None:
+            for key, value in self.session.headers(host).items():
                 request.add_header(key, value)
-        if request_data and ('Content-Type' not in self.request_headers):
-            request.add_header('Content-Type', 'application/json')
 
         request.get_method = lambda: method
-        return Response(self._make_request(opener, request, timeout=timeout))
+        return request
+
+    def _balanced_request(self, opener, method, endpoint, params, request_headers, request_data, timeout, trace=None):
+        tried = []
+        while True:
+            node = self.nodes.acquire(exclude=tried)
+            started = time.time()
+            try:
+                response = self._send_to(
+                    opener, method, node.url, endpoint, params, request_headers, request_data, timeout, trace)
+            except NODE_ERRORS as err:
+                if is_read_timeout(err):
+                    # the node answered the connect and is busy on the request, not down
+                    self.nodes.release(node, time.time() - started)
+                    raise
+                self.nodes.release(node, failed=True)
+                tried.append(node)
+                # only idempotent calls are safe to replay on another node
+                if method not in IDEMPOTENT_METHODS or len(tried) >= len(self.nodes):
+                    raise
+                logger.warning('{} {} failed on {}: {!r}, failing over'.format(method, endpoint, node.url, err))
+                continue
+            except Exception:
+                self.nodes.release(node, time.time() - started)
+                raise
+            self.nodes.release(node, time.time() - started)
+            return response
+
+    def _send(self, opener, host, request, timeout, trace=None):
+        if trace is None:
+            return self._guarded_request(opener, host, request, timeout)
+
+        trace.start_attempt(host, request.get_full_url(), dict(request.header_items()), request.data)
+        # read by the keep-alive handlers to report connection reuse and connect timings
+        request.trace = trace
+        self.hooks.emit('before_request', trace)
+        try:
+            response = self._guarded_request(opener, host, request, timeout)
+        except Exception as err:
+            trace.ttfb = time.time() - trace.sent
+            trace.status_code = getattr(err, 'status_code', None)
+            trace.error = err
+            self.hooks.emit('on_error', trace)
+            raise
+        trace.ttfb = time.time() - trace.sent
+        trace.status_code = response.getcode()
+        return response
+
+    def _guarded_request(self, opener, host, request, timeout):
+        if self.breakers is None:
+            return self._limited_request(opener, host, request, timeout)
+
+        breaker = self.breakers.get(host)
+        if not breaker.allow():
+            raise CircuitOpenError(host)
+        recorded = False
+        try:
+            response = self._limited_request(opener, host, request, timeout)
+        except LimitTimeoutError:
+            # the request never reached the host, it says nothing about its health
+            raise
+        except Exception as err:
+            if self.breakers.is_failure(err):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            recorded = True
+            raise
+        else:
+            breaker.record_success()
+            recorded = True
+        finally:
+            # also frees the trial slot of a half-open circuit on KeyboardInterrupt and the like
+            if not recorded:
+                breaker.cancel()
+        return response
+
+    def _limited_request(self, opener, host, request, timeout):
+        if not self.limits:
+            return self._make_request(opener, request, timeout=timeout)
+
+        limiter = self.limits.limiter(host)
+        limiter.acquire()
+        try:
+            return self._make_request(opener, request, timeout=timeout)
+        finally:
+            limiter.release()
 
     def get(self, endpoint, params=None, **kwargs):
         return self._request('get', endpoint, params=params, **kwargs)
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import threading
+import zlib
+
+ACCEPT_ENCODING = 'gzip, deflate'
+CHUNK_SIZE = 64 * 1024
+
+
+class TransferStats(object):
+    """
+    Byte counters for response bodies.
+
+    `compressed_bytes` counts what came over the wire and
+    `uncompressed_bytes` what it decoded to, so a response
+    sent without compression adds the same amount to both.
+    """
+
+    def __init__(self):
+        self.responses = 0
+        self.compressed_responses = 0
+        self.compressed_bytes = 0
+        self.uncompressed_bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, compressed_bytes, uncompressed_bytes, is_compressed=False):
+        with self._lock:
+            self.responses += 1
+            self.compressed_bytes += compressed_bytes
+            self.uncompressed_bytes += uncompressed_bytes
+            if is_compressed:
+                self.compressed_responses += 1
+
+    @property
+    def ratio(self):
+        if not self.compressed_bytes:
+            return None
+        return self.uncompressed_bytes / self.compressed_bytes
+
+    def reset(self):
+        with self._lock:
+            self.responses = 0
+            self.compressed_responses = 0
+            self.compressed_bytes = 0
+            self.uncompressed_bytes = 0
+
+    def __repr__(self):
+        return ('<TransferStats '
+                'compressed_bytes: {self.compressed_bytes}, '
+                'uncompressed_bytes: {self.uncompressed_bytes}>').format(**locals())
+
+
+def content_encoding(headers):
+    try:
+        encoding = headers.get('Content-Encoding')
+    except AttributeError:
+        return None
+    return encoding.strip().lower() if encoding else None
+
+
+class DecodedStream(object):
+    """
+    File-like wrapper that decodes a gzip or deflate body chunk by chunk,
+    so the compressed and the decoded body are never both held in full.
+    """
+
+    def __init__(self, fp, encoding=None, stats=None, chunk_size=CHUNK_SIZE):
+        self._fp = fp
+        self.encoding = encoding if encoding in ('gzip', 'deflate') else None
+        self._stats = stats
+        self._chunk_size = chunk_size
+        self._decompressor = self._new_decompressor()
+        self._pending = b''
+        self._eof = False
+        self.compressed_bytes = 0
+        self.uncompressed_bytes = 0
+
+    def _new_decompressor(self, raw_deflate=False):
+        if self.encoding == 'gzip':
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self.encoding == 'deflate':
+            return zlib.decompressobj(-zlib.MAX_WBITS if raw_deflate else zlib.MAX_WBITS)
+        return None
+
+    def _decompress(self, data):
+        if self._decompressor is None:
+            return data
+        try:
+            rv = self._decompressor.decompress(data)
+        except zlib.error:
+            if self.encoding != 'deflate' or self.uncompressed_bytes or self.compressed_bytes > len(data):
+                raise
+            # some servers send raw deflate without the zlib header
+            self._decompressor = self._new_decompressor(raw_deflate=True)
+            rv = self._decompressor.decompress(data)
+
+        unused_data = self._decompressor.unused_data
+        if self.encoding == 'gzip' and unused_data:
+            # concatenated gzip members
+            self._decompressor = self._new_decompressor()
+            rv += self._decompress(unused_data)
+        return rv
+
+    def decode(self, data):
+        """
+        Decode one chunk of the body, for callers that push the chunks
+        in themselves instead of reading them from `fp`.
+        """
+        self.compressed_bytes += len(data)
+        rv = self._decompress(data)
+        self.uncompressed_bytes += len(rv)
+        return rv
+
+    def flush(self):
+        """
+        :return: whatever the decompressor still holds, once the body has ended
+        """
+        if self._eof:
+            return b''
+        self._eof = True
+        tail = self._decompressor.flush() if self._decompressor is not None else b''
+        self.uncompressed_bytes += len(tail)
+        if self._stats is not None:
+            self._stats.add(
+                self.compressed_bytes,
+                self.uncompressed_bytes,
+                is_compressed=self.encoding is not None,
+            )
+        return tail
+
+    def _read_chunk(self):
+        data = self._fp.read(self._chunk_size)
+        if not data:
+            self._pending += self.flush()
+            return b''
+        return self.decode(data)
+
+    def read(self, amt=None):
+        if amt is None or amt < 0:
+            if self._decompressor is None and not self._pending and not self._eof:
+                data = self.decode(self._fp.read())
+                self.flush()
+                return data
+
+            buf = io.BytesIO()
+            buf.write(self._pending)
+            self._pending = b''
+            while not self._eof:
+                buf.write(self._read_chunk())
+            buf.write(self._pending)
+            self._pending = b''
+            return buf.getvalue()
+
+        while len(self._pending) < amt and not self._eof:
+            self._pending += self._read_chunk()
+        rv, self._pending = self._pending[:amt], self._pending[amt:]
+        return rv
+
+    def close(self):
+        close = getattr(self._fp, 'close', None)
+        if close is not None:
+            close()
+
+
+def decoded_stream(fp, headers, stats=None):
+    return DecodedStream(fp, content_encoding(headers), stats)
@@ -6,6 +6,9 @@ from __future__ import unicode_literals
 
 import json
 
+from kylinpy.client.compression import decoded_stream
+from kylinpy.utils.compat import URLError
+
 
 class HTTPError(Exception):
     """ Base of all other errors"""
@@ -13,8 +16,8 @@ class HTTPError(Exception):
     def __init__(self, error):
         self.status_code = error.code
         self.reason = error.reason
-        self.body = error.read()
         self.headers = error.hdrs
+        self.body = decoded_stream(error, self.headers).read()
 
     def json(self):
         """
@@ -73,6 +76,27 @@ class GatewayTimeoutError(HTTPError):
     pass
 
 
+class CircuitOpenError(URLError):
+    """ Raise when the circuit breaker of a host is open and requests fail fast """
+
+    def __init__(self, host):
+        super(CircuitOpenError, self).__init__('Circuit breaker is open for {}'.format(host))
+        self.host = host
+
+
+class ReadTimeoutError(URLError):
+    """ Raise when a node took a request but sent no response in time, it may still be running it """
+
+
+class LimitTimeoutError(Exception):
+    """ Raise when a request waited too long for a client-side concurrency or rate limit """
+
+    def __init__(self, name, limit):
+        super(LimitTimeoutError, self).__init__('Timed out waiting for the {} limit of {}'.format(limit, name))
+        self.name = name
+        self.limit = limit
+
+
 err_dict = {
     400: BadRequestsError,
     401: UnauthorizedError,
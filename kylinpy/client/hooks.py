@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import socket
+import time
+
+from kylinpy.logger import logger
+
+EVENTS = ('before_request', 'after_response', 'on_error', 'on_retry')
+
+
+class RequestTrace(object):
+    """
+    What the hooks of one request get to see, reused across its retries.
+
+    Timings are in seconds and None when unknown:
+
+    - dns, connect: name resolution and TCP connect of a new connection,
+      measured on Python 3 only
+    - ttfb: from sending the attempt to the response headers, including
+      the wait for client-side limits and the connect
+    - body: reading the response body, not measured for streamed responses
+    - total: from the first attempt to the end of the body
+
+    response_bytes counts the body as received, before decompression,
+    except for the asyncio client which reports the decoded size.
+    """
+
+    def __init__(self, method, endpoint):
+        self.method = method
+        self.endpoint = endpoint
+        self.started = time.time()
+        self.attempt = 0
+        self.retry_delay = None
+        self.response_bytes = None
+        self.total = None
+        self._reset(None, None, None, None)
+
+    def _reset(self, host, url, headers, data):
+        self.host = host
+        self.url = url
+        self.headers = headers
+        self.data = data
+        self.request_bytes = len(data or b'')
+        self.sent = time.time()
+        self.dns = None
+        self.connect = None
+        self.reused = None
+        self.ttfb = None
+        self.body = None
+        self.status_code = None
+        self.error = None
+
+    def start_attempt(self, host, url, headers, data):
+        self.attempt += 1
+        self._reset(host, url, headers, data)
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+    def __repr__(self):
+        return '<RequestTrace {} {}, attempt: {}, status: {}>'.format(
+            self.method, self.url or self.endpoint, self.attempt, self.status_code)
+
+
+class Hooks(object):
+    """
+    Callbacks run around every HTTP request of a `Client`, each gets the
+    `RequestTrace`. A `Client` without hooks does not build traces at all.
+
+        hooks = Hooks()
+        hooks.register('after_response', lambda trace: statsd.timing('kylin', trace.total))
+    """
+
+    def __init__(self):
+        self._hooks = dict((event, []) for event in EVENTS)
+
+    def register(self, event, hook):
+        if event not in self._hooks:
+            raise ValueError('Unknown hook event: {}, expected one of {}'.format(event, EVENTS))
+        self._hooks[event].append(hook)
+        return hook
+
+    def unregister(self, event, hook):
+        self._hooks[event].remove(hook)
+
+    def __bool__(self):
+        return any(self._hooks.values())
+
+    __nonzero__ = __bool__
+
+    def emit(self, event, trace):
+        for hook in self._hooks[event]:
+            try:
+                hook(trace)
+            except Exception:
+                logger.exception('{} hook {!r} failed'.format(event, hook))
+
+
+def _mask_auth_headers(headers):
+    return dict(
+        (key, '******' if key.lower() == 'authorization' else value)
+        for (key, value) in headers.items()
+    )
+
+
+def debug_log_hook(mask_auth=True):
+    """
+    :return: a before_request hook logging the full request at DEBUG level
+    """
+    def log_request(trace):
+        logger.debug("""
+==========================[QUERY]===============================
+method: {}
+url: {}
+headers: {}
+body: {}
+==========================[QUERY]===============================""".format(
+            trace.method,
+            trace.url,
+            _mask_auth_headers(trace.headers) if mask_auth else trace.headers,
+            trace.data))
+    return log_request
+
+
+def timed_create_connection(trace):
+    """
+    :return: a replacement for `socket.create_connection` recording dns and connect times on `trace`
+    """
+    def create_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+        host, port = address
+        started = time.time()
+        addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        resolved = time.time()
+        trace.dns = resolved - started
+        error = None
+        for family, socktype, proto, _, sockaddr in addresses:
+            sock = socket.socket(family, socktype, proto)
+            try:
+                if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                    sock.settimeout(timeout)
+                if source_address:
+                    sock.bind(source_address)
+                sock.connect(sockaddr)
+            except socket.error as err:
+                error = err
+                sock.close()
+                continue
+            trace.connect = time.time() - resolved
+            return sock
+        raise error or socket.error('getaddrinfo returns an empty list')
+    return create_connection
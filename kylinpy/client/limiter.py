@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import threading
+import time
+from collections import deque
+
+from kylinpy.client.exceptions import LimitTimeoutError
+
+
+class FairSemaphore(object):
+    """Semaphore that hands free slots to waiters in arrival order."""
+
+    def __init__(self, value):
+        self.value = value
+        self._available = value
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def in_flight(self):
+        return self.value - self._available
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    def acquire(self, timeout=None):
+        if timeout is not None and timeout <= 0:
+            return self.enqueue(None)
+        waiter = threading.Event()
+        if self.enqueue(waiter) or waiter.wait(timeout):
+            return True
+        # the slot may have been handed over while timing out
+        return not self.discard(waiter)
+
+    def enqueue(self, waiter):
+        """
+        :param waiter: object whose `set()` is called, under the lock, when
+            a slot is handed over to it. None only takes a free slot.
+        :return: whether a free slot was taken, otherwise `waiter` waits in line
+        """
+        with self._lock:
+            if self._available > 0 and not self._waiters:
+                self._available -= 1
+                return True
+            if waiter is not None:
+                self._waiters.append(waiter)
+            return False
+
+    def discard(self, waiter):
+        """
+        :return: whether `waiter` left the line, False when a slot was
+            already handed over to it and the caller owns that slot
+        """
+        with self._lock:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                return False
+            return True
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                self._waiters.popleft().set()
+            else:
+                self._available += 1
+
+
+class TokenBucket(object):
+    """
+    `rate` tokens per second, up to `burst` saved up. Callers reserve a
+    token and sleep off the debt, so they are served in arrival order.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(1, rate))
+        self._tokens = self.burst
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait=None):
+        """
+        :return: seconds to wait for the reserved token, or None when that exceeds `max_wait`
+        """
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+    def refund(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+
+class Limiter(object):
+    """
+    Caps requests in flight and requests per second for one scope.
+    Callers over the limit wait in line for up to `max_wait` seconds,
+    then get `LimitTimeoutError`.
+    """
+
+    def __init__(self, name, max_concurrency=0, rate=0, burst=None, max_wait=30):
+        self.name = name
+        self.max_wait = max_wait
+        self.semaphore = FairSemaphore(max_concurrency) if max_concurrency else None
+        self.bucket = TokenBucket(rate, burst) if rate else None
+
+    def acquire(self, timeout=None):
+        timeout = self.max_wait if timeout is None else timeout
+        deadline = time.time() + timeout
+        if self.bucket is not None:
+            wait = self.bucket.reserve(timeout)
+            if wait is None:
+                raise LimitTimeoutError(self.name, 'rate')
+            if wait:
+                time.sleep(wait)
+        if self.semaphore is not None and not self.semaphore.acquire(max(0.0, deadline - time.time())):
+            if self.bucket is not None:
+                # the request does not run, give its token to the next one
+                self.bucket.refund()
+            raise LimitTimeoutError(self.name, 'concurrency')
+
+    def try_acquire(self):
+        """
+        :return: whether a slot was taken without waiting
+        """
+        if self.bucket is not None and self.bucket.reserve(0) is None:
+            return False
+        if self.semaphore is not None and not self.semaphore.acquire(0):
+            if self.bucket is not None:
+                self.bucket.refund()
+            return False
+        return True
+
+    def release(self):
+        if self.semaphore is not None:
+            self.semaphore.release()
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class Limits(object):
+    """
+    Client-side limits of a `Kylin` instance.
+
+    Limiters are kept per process and shared by every instance with the
+    same settings, scoped per host ('host') or per project ('project').
+    """
+
+    def __init__(self, max_concurrency=0, rate=0, burst=None, max_wait=30, scope='host', cluster=None, project=None):
+        if scope not in ('host', 'project'):
+            raise ValueError("Unknown limit scope: {}, expected 'host' or 'project'".format(scope))
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self.scope = scope
+        self.cluster = cluster
+        self.project = project
+
+    def __bool__(self):
+        return bool(self.max_concurrency or self.rate)
+
+    __nonzero__ = __bool__
+
+    def limiter(self, host):
+        name = host if self.scope == 'host' else '{}/{}'.format(self.cluster or host, self.project)
+        key = (name, self.max_concurrency, self.rate, self.burst, self.max_wait)
+        limiter = _limiters.get(key)
+        if limiter is None:
+            with _limiters_lock:
+                limiter = _limiters.get(key)
+                if limiter is None:
+                    limiter = _limiters[key] = Limiter(
+                        name, self.max_concurrency, self.rate, self.burst, self.max_wait)
+        return limiter
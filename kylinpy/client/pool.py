@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import socket
+import ssl
+import threading
+import time
+from collections import deque
+
+from kylinpy.client.exceptions import ReadTimeoutError
+from kylinpy.client.hooks import timed_create_connection
+from kylinpy.logger import logger
+from kylinpy.utils.compat import PY3
+from kylinpy.utils.compat import http_client
+from kylinpy.utils.compat import urllib
+from kylinpy.utils.compat import URLError
+
+_ssl_contexts = {}
+_ssl_contexts_lock = threading.Lock()
+
+
+def get_ssl_context(unverified=False):
+    """
+    :return: a process-wide SSL context, built once for each verify mode
+    """
+    unverified = bool(unverified)
+    with _ssl_contexts_lock:
+        if unverified not in _ssl_contexts:
+            if unverified:
+                _ssl_contexts[unverified] = ssl._create_unverified_context()
+            else:
+                _ssl_contexts[unverified] = ssl.create_default_context()
+        return _ssl_contexts[unverified]
+
+
+class ConnectionPool(object):
+    """Keep-alive connections to a single host."""
+
+    def __init__(self, scheme, host, maxsize=10, idle_timeout=60, ssl_context=None):
+        self.scheme = scheme
+        self.host = host
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.ssl_context = ssl_context
+        self.num_connections = 0
+        self.num_requests = 0
+        self._idle = deque()
+        self._lock = threading.Lock()
+
+    def new_connection(self, timeout=None):
+        with self._lock:
+            self.num_connections += 1
+            self.num_requests += 1
+        return self._connection(timeout)
+
+    def _connection(self, timeout=None):
+        kwargs = {}
+        if timeout is not None:
+            kwargs['timeout'] = timeout
+        if self.scheme == 'https':
+            return http_client.HTTPSConnection(self.host, context=self.ssl_context, **kwargs)
+        return http_client.HTTPConnection(self.host, **kwargs)
+
+    def get(self, timeout=None):
+        """
+        :return: tuple of (connection, is_reused)
+        """
+        expired = []
+        conn = None
+        with self._lock:
+            deadline = time.time() - self.idle_timeout
+            while self._idle and self._idle[0][1] < deadline:
+                expired.append(self._idle.popleft()[0])
+            if self._idle:
+                conn = self._idle.pop()[0]
+                self.num_requests += 1
+        for _conn in expired:
+            _conn.close()
+
+        if conn is None:
+            return self.new_connection(timeout), False
+
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def put(self, conn):
+        with self._lock:
+            if len(self._idle) < self.maxsize:
+                self._idle.append((conn, time.time()))
+                return
+        conn.close()
+
+    def prefill(self, count, timeout=None):
+        """
+        Open connections until `count`, at most `maxsize`, are idle.
+
+        :return: number of connections opened
+        """
+        opened = 0
+        while self.num_idle < min(count, self.maxsize):
+            conn = self._connection(timeout)
+            try:
+                conn.connect()
+            except (socket.error, http_client.HTTPException) as err:
+                conn.close()
+                logger.warning('Opening a connection to {} failed: {!r}'.format(self.host, err))
+                break
+            with self._lock:
+                self.num_connections += 1
+            self.put(conn)
+            opened += 1
+        return opened
+
+    @property
+    def num_idle(self):
+        return len(self._idle)
+
+    def clear(self):
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for conn, _ in idle:
+            conn.close()
+
+    def __repr__(self):
+        return ('<ConnectionPool '
+                '{self.scheme}://{self.host}, '
+                'idle: {self.num_idle}/{self.maxsize}>').format(**locals())
+
+
+class PoolManager(object):
+    """Per-host keep-alive connection pools."""
+
+    def __init__(self, maxsize=10, idle_timeout=60):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def connection_pool(self, scheme, host, unverified=False):
+        key = (scheme, host, bool(unverified))
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                ssl_context = get_ssl_context(unverified) if scheme == 'https' else None
+                pool = ConnectionPool(
+                    scheme,
+                    host,
+                    maxsize=self.maxsize,
+                    idle_timeout=self.idle_timeout,
+                    ssl_context=ssl_context,
+                )
+                self._pools[key] = pool
+            return pool
+
+    @property
+    def pools(self):
+        return list(self._pools.values())
+
+    def clear(self):
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            pool.clear()
+
+
+class PooledResponse(object):
+    """
+    File-like response that hands its connection back to the pool
+    once the body has been read to the end.
+    """
+
+    def __init__(self, response, conn, pool, url):
+        self._response = response
+        self._conn = conn
+        self._pool = pool
+        self.code = response.status
+        self.msg = response.reason
+        self.headers = response.msg
+        self.url = url
+
+    @property
+    def status(self):
+        return self.code
+
+    @property
+    def reason(self):
+        return self.msg
+
+    def getcode(self):
+        return self.code
+
+    def geturl(self):
+        return self.url
+
+    def info(self):
+        return self.headers
+
+    def read(self, amt=None):
+        if amt is None:
+            data = self._response.read()
+        else:
+            data = self._response.read(amt)
+        if amt is None or not data:
+            self._release()
+        return data
+
+    def close(self):
+        self._release()
+
+    def _release(self):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        if self._response.will_close or not self._response.isclosed():
+            self._response.close()
+            conn.close()
+        else:
+            self._pool.put(conn)
+
+
+def _is_stale_connection_error(err):
+    return not isinstance(err, socket.timeout) and isinstance(
+        err, (socket.error, http_client.BadStatusLine),
+    )
+
+
+def _get_response(conn):
+    try:
+        return conn.getresponse()
+    except socket.timeout as err:
+        raise ReadTimeoutError(err)
+
+
+class _KeepAliveMixin(object):
+    def __init__(self, pool_manager, unverified=False):
+        self.pool_manager = pool_manager
+        self.unverified = unverified
+
+    def _keep_alive_open(self, fallback, req):
+        if getattr(req, '_tunnel_host', None):
+            # proxy tunnels are rare enough to go through the stock handler
+            return fallback(req)
+
+        if PY3:
+            scheme, host, selector = req.type, req.host, req.selector
+        else:
+            scheme, host, selector = req.get_type(), req.get_host(), req.get_selector()
+
+        headers = dict(req.unredirected_hdrs)
+        headers.update((k, v) for k, v in req.headers.items() if k not in headers)
+        headers = dict((name.title(), value) for name, value in headers.items())
+        headers['Connection'] = 'keep-alive'
+
+        pool = self.pool_manager.connection_pool(scheme, host, self.unverified)
+        timeout = getattr(req, 'timeout', None)
+        if timeout is socket._GLOBAL_DEFAULT_TIMEOUT:
+            timeout = None
+        conn, is_reused = pool.get(timeout)
+        trace = getattr(req, 'trace', None)
+        if trace is not None:
+            trace.reused = is_reused
+        try:
+            response = self._send(conn, req, selector, headers, trace)
+        except ReadTimeoutError:
+            conn.close()
+            raise
+        except (socket.error, http_client.HTTPException) as err:
+            conn.close()
+            if not (is_reused and _is_stale_connection_error(err)):
+                raise URLError(err)
+            # the server closed an idle keep-alive connection, retry on a new one
+            logger.debug('Stale keep-alive connection to {}, reconnecting'.format(host))
+            conn = pool.new_connection(timeout)
+            if trace is not None:
+                trace.reused = False
+            try:
+                response = self._send(conn, req, selector, headers, trace)
+            except ReadTimeoutError:
+                conn.close()
+                raise
+            except (socket.error, http_client.HTTPException) as err:
+                conn.close()
+                raise URLError(err)
+
+        return PooledResponse(response, conn, pool, req.get_full_url())
+
+    @staticmethod
+    def _send(conn, req, selector, headers, trace=None):
+        if trace is None or conn.sock is not None or not PY3:
+            conn.request(req.get_method(), selector, req.data, headers)
+            return _get_response(conn)
+
+        # time the connect of this request only, the connection outlives the trace
+        conn._create_connection = timed_create_connection(trace)
+        try:
+            conn.request(req.get_method(), selector, req.data, headers)
+        finally:
+            conn._create_connection = socket.create_connection
+        return _get_response(conn)
+
+
+class KeepAliveHTTPHandler(_KeepAliveMixin, urllib.HTTPHandler):
+    def __init__(self, pool_manager, unverified=False):
+        urllib.HTTPHandler.__init__(self)
+        _KeepAliveMixin.__init__(self, pool_manager, unverified)
+
+    def http_open(self, req):
+        return self._keep_alive_open(super(KeepAliveHTTPHandler, self).http_open, req)
+
+
+class KeepAliveHTTPSHandler(_KeepAliveMixin, urllib.HTTPSHandler):
+    def __init__(self, pool_manager, unverified=False):
+        urllib.HTTPSHandler.__init__(self, context=get_ssl_context(unverified))
+        _KeepAliveMixin.__init__(self, pool_manager, unverified)
+
+    def https_open(self, req):
+        return self._keep_alive_open(super(KeepAliveHTTPSHandler, self).https_open, req)
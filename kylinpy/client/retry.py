@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import random
+import socket
+import threading
+import time
+from collections import Counter
+from email.utils import mktime_tz, parsedate_tz
+
+from kylinpy.client.exceptions import CircuitOpenError, HTTPError, ReadTimeoutError
+from kylinpy.utils.compat import URLError, http_client
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+
+# errors raised before any response arrived
+CONNECTION_ERRORS = (URLError, socket.error, socket.timeout, http_client.HTTPException)
+
+
+def is_read_timeout(error):
+    """
+    :return: whether `error` is a timeout waiting for the response to a sent
+        request, a slow query rather than an unreachable node
+    """
+    # a bare socket.timeout only escapes urllib once the request was sent
+    return isinstance(error, (ReadTimeoutError, socket.timeout))
+
+
+def retry_after(error):
+    """
+    :return: seconds asked for by the Retry-After header of an HTTP error, or None
+    """
+    headers = getattr(error, 'headers', None)
+    value = headers.get('Retry-After') if headers is not None else None
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(0.0, mktime_tz(parsed) - time.time())
+
+
+class RetryPolicy(object):
+    """
+    Retry overloaded or unreachable Kylin nodes with jittered exponential backoff.
+
+    Idempotent methods are retried on connection errors and on `statuses`.
+    POST/PUT/DELETE are only retried on `safe_statuses`, the responses a
+    server sends when it rejected the request without running it.
+
+    A read timeout already waited the whole timeout for a node that may
+    still be working on the request, it is only retried with
+    `retry_read_timeouts`.
+    """
+
+    def __init__(
+        self,
+        max_attempts=3,
+        backoff_factor=0.5,
+        max_backoff=30,
+        statuses=(429, 503, 504),
+        safe_statuses=(429, 503),
+        retry_read_timeouts=False,
+    ):
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.statuses = frozenset(statuses)
+        self.safe_statuses = frozenset(safe_statuses)
+        self.retry_read_timeouts = retry_read_timeouts
+        self._counters = Counter()
+        self._lock = threading.Lock()
+
+    def should_retry(self, method, error, attempt):
+        """
+        :param attempt: number of attempts made so far, starting at 1
+        """
+        if attempt >= self.max_attempts or isinstance(error, CircuitOpenError):
+            return False
+        if isinstance(error, HTTPError):
+            status_code = getattr(error, 'status_code', None)
+            if method in IDEMPOTENT_METHODS:
+                return status_code in self.statuses
+            return status_code in self.safe_statuses
+        if is_read_timeout(error) and not self.retry_read_timeouts:
+            return False
+        return method in IDEMPOTENT_METHODS and isinstance(error, CONNECTION_ERRORS)
+
+    def backoff(self, attempt, error=None):
+        """
+        :return: seconds to sleep before the next attempt, Retry-After wins over the computed backoff
+        """
+        delay = retry_after(error)
+        if delay is None:
+            # "full jitter": spread the retries of many clients over the whole window
+            delay = random.uniform(0, self.backoff_factor * (2 ** (attempt - 1)))
+        return min(delay, self.max_backoff)
+
+    def record(self, method, endpoint):
+        with self._lock:
+            self._counters['{} {}'.format(method, endpoint)] += 1
+
+    @property
+    def counters(self):
+        """
+        :return: dict of retries per '<METHOD> <endpoint>'
+        """
+        with self._lock:
+            return dict(self._counters)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import threading
+
+from kylinpy.logger import logger
+from kylinpy.utils.compat import CookieJar
+from kylinpy.utils.compat import urllib
+from kylinpy.utils.compat import urlparse
+
+
+def _origin(url):
+    parts = urlparse(url)
+    return '{}://{}'.format(parts.scheme, parts.netloc)
+
+
+class NodeSession(object):
+    """Session state of one node, nodes of a cluster do not share sessions."""
+
+    def __init__(self):
+        self.cookies = CookieJar()
+        self.basic = False
+        self.generation = 0
+
+
+class Session(object):
+    """
+    Server-side sessions shared by the clients of one `Kylin` instance.
+
+    `authenticate(client)` logs in with `auth_headers` on one node, the
+    session cookie it sets lands in that node's `cookies`, which every
+    client's opener sends along to the node instead of the Basic
+    `Authorization` header. When a node sets no cookie the clients fall
+    back to sending `auth_headers` on each request to it.
+    """
+
+    def __init__(self, auth_headers, authenticate):
+        self.auth_headers = auth_headers
+        self.num_authentications = 0
+        self._authenticate = authenticate
+        self._nodes = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def node(self, host):
+        """
+        :param host: 'scheme://host:port' of the node, or any URL on it
+        :return: the `NodeSession` of the node
+        """
+        origin = _origin(host)
+        node = self._nodes.get(origin)
+        if node is None:
+            node = self._nodes.setdefault(origin, NodeSession())
+        return node
+
+    @property
+    def logging_in(self):
+        """
+        :return: the node the current thread is running `authenticate` on, or None
+        """
+        return getattr(self._local, 'logging_in', None)
+
+    def headers(self, host):
+        """
+        :return: the auth headers a request of the current thread to `host` has to carry
+        """
+        if self.node(host).basic or self.logging_in == _origin(host):
+            return self.auth_headers
+        return {}
+
+    def login(self, client, host, generation=0):
+        """
+        Authenticate on `host`, unless another caller did since `generation`
+        was read, so a burst of 401s from an expired session logs in once.
+        """
+        node = self.node(host)
+        with self._lock:
+            if node.generation != generation:
+                return
+            node.cookies.clear()
+            self._local.logging_in = _origin(host)
+            try:
+                self._authenticate(client)
+            finally:
+                self._local.logging_in = None
+            self.num_authentications += 1
+            node.basic = not len(node.cookies)
+            if node.basic:
+                logger.warning('{} set no session cookie, falling back to basic auth'.format(host))
+            node.generation += 1
+
+
+class SessionCookieProcessor(urllib.BaseHandler):
+    """Sends and stores the cookies of each node in the node's own jar."""
+
+    def __init__(self, session):
+        self.session = session
+
+    def http_request(self, request):
+        self.session.node(request.get_full_url()).cookies.add_cookie_header(request)
+        return request
+
+    def http_response(self, request, response):
+        self.session.node(request.get_full_url()).cookies.extract_cookies(response, request)
+        return response
+
+    https_request = http_request
+    https_response = http_response
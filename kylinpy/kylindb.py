@@ -4,10 +4,12 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import itertools
+
 from kylinpy.client import HTTPError
 from kylinpy.kylinpy import Kylin
 from kylinpy.utils.compat import as_unicode
-from kylinpy.utils.kylin_types import kylin_to_python
+from kylinpy.utils.kylin_types import row_converter
 
 
 class Cursor(object):
@@ -17,17 +19,50 @@ class Cursor(object):
         self.rowcount = -1
         self.results = []
         self.fetched_rows = 0
+        self._raw_results = None
+        self._convert = None
         self._column_metas = []
+        self._description = ()
+        self._rows = iter(())
+        self._stream = None
 
     def callproc(self):
         pass
 
     def close(self):
-        pass
+        self._close_stream()
+
+    def _close_stream(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
 
     @property
     def description(self):
-        return tuple([
+        return self._description
+
+    @property
+    def results(self):
+        """
+        :return: the converted rows of the last result, converted on first
+            use, None for a streamed or paged result
+        """
+        if self._results is None and self._raw_results is not None:
+            self._results = [self._convert(row) for row in self._raw_results]
+            self._raw_results = None
+        return self._results
+
+    @results.setter
+    def results(self, results):
+        self._results = results
+        self._raw_results = None
+
+    def _set_column_metas(self, column_metas):
+        """
+        :return: the converter of the rows of a result with `column_metas`
+        """
+        self._column_metas = column_metas or []
+        self._description = tuple([
             as_unicode(c['label']),
             c['columnTypeName'].lower(),
             c['displaySize'],
@@ -36,18 +71,39 @@ class Cursor(object):
             c['scale'],
             c['isNullable'],
         ] for c in self._column_metas)
+        return row_converter([d[1] for d in self._description])
 
     def execute(self, query, parameters=None):
         if parameters is None:
             parameters = {}
+        self._close_stream()
+
+        if self.connection.query_page_size > 0:
+            pages = self.connection.query_pages(query, **parameters)
+            convert = self._set_column_metas(pages.column_metas)
+            self.results = None
+            self._rows = (convert(row) for row in pages)
+            self.rowcount = -1
+            self.fetched_rows = 0
+            return
+
+        if self.connection.stream_results:
+            self._stream = self.connection.query(query, stream=True, **parameters)
+            convert = self._set_column_metas(self._stream.column_metas)
+            self.results = None
+            self._rows = (convert(row) for row in self._stream)
+            self.rowcount = -1
+            self.fetched_rows = 0
+            return
+
         resp = self.connection.query(query, **parameters)
 
-        self._column_metas = resp.get('columnMetas')
-        self.results = [tuple([
-            kylin_to_python(self.description[col][1], cell)
-            for (col, cell) in enumerate(row)
-        ]) for row in resp['results']]
-        self.rowcount = len(self.results)
+        convert = self._set_column_metas(resp.get('columnMetas'))
+        # rows are converted as they are fetched, previews fetching a few pay for a few
+        self.results = None
+        self._raw_results, self._convert = resp['results'], convert
+        self._rows = (convert(row) for row in resp['results'])
+        self.rowcount = len(resp['results'])
         self.fetched_rows = 0
 
     def executemany(self, query, seq_params=None):
@@ -56,30 +112,40 @@ class Cursor(object):
         results = []
         for param in seq_params:
             self.execute(query, param)
-            results.extend(self.results)
+            results.extend(self.fetchall())
 
         self.results = results
+        self._rows = iter(self.results)
         self.rowcount = len(self.results)
         self.fetched_rows = 0
 
     def fetchone(self):
-        if self.fetched_rows < self.rowcount:
-            row = self.results[self.fetched_rows]
+        row = next(self._rows, None)
+        if row is not None:
             self.fetched_rows += 1
-            return row
-        else:
-            return None
+        return row
 
     def fetchmany(self, size=None):
-        fetched_rows = self.fetched_rows
         size = size or self.arraysize
-        self.fetched_rows = fetched_rows + size
-        return self.results[fetched_rows: self.fetched_rows]
+        rows = list(itertools.islice(self._rows, size))
+        self.fetched_rows += len(rows)
+        return rows
 
     def fetchall(self):
-        fetched_rows = self.fetched_rows
-        self.fetched_rows = self.rowcount
-        return self.results[fetched_rows:]
+        rows = list(self._rows)
+        self.fetched_rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    next = __next__
 
     def nextset(self):
         pass
@@ -113,7 +179,7 @@ class Connection(Kylin):
         return cls(**kwargs)
 
     def close(self):
-        pass
+        super(Connection, self).close()
 
     def commit(self):
         pass
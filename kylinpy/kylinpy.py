@@ -6,14 +6,32 @@ from __future__ import unicode_literals
 
 import base64
 import logging
+import threading
 import warnings
 
 from kylinpy.client import Client as HTTPClient
+from kylinpy.client.balancer import NodeSet
+from kylinpy.client.breaker import CircuitBreakers
+from kylinpy.client.limiter import Limits
+from kylinpy.client.compression import TransferStats
+from kylinpy.client.hooks import Hooks, debug_log_hook
+from kylinpy.client.pool import PoolManager
+from kylinpy.client.retry import RetryPolicy
+from kylinpy.client.session import Session
 from kylinpy.exceptions import KylinCubeError
 from kylinpy.service import KylinService, KE3Service, KE4Service
+from kylinpy.service._query_pages import WINDOW_SIZE, QueryPages
+from kylinpy.service._service_interface import PAGE_SIZE
+from kylinpy.service.change_detector import SOURCES, ChangeDetector
+from kylinpy.utils.cache import MetadataCache
+from kylinpy.utils.snapshot import MetadataSnapshot
 from kylinpy.datasource import TableSource, CubeSource, KE4ModelSource
 from kylinpy.job import KylinJob, Ke3Job, Ke4Job
+from kylinpy.logger import logger
 from kylinpy.utils.compat import as_unicode, urlparse, parse_qsl
+from kylinpy.utils.helper import as_bool
+from kylinpy.utils.json_codec import get_codec
+from kylinpy.utils.workers import map_concurrently
 
 SERVICES = {
     'v1': KylinService,
@@ -30,11 +48,13 @@ Job = {
 
 class Kylin(object):
     def __init__(self, host, username=None, password=None, port=7070, project=None, **connect_args):
-        if host.startswith(('http://', 'https://')):
-            _, self.host = host.split('://')
-        else:
-            self.host = host
-        self.port = port
+        # only the node lists carry a port of their own, a single `host` keeps using `port`
+        hosts = list(host) if isinstance(host, (list, tuple)) else []
+        hosts += [h.strip() for h in (connect_args.get('nodes') or '').split(',') if h.strip()]
+        self.nodes = [self._parse_node(h, port) for h in hosts]
+        if not isinstance(host, (list, tuple)):
+            self.nodes.insert(0, (self._strip_scheme(host), port))
+        self.host, self.port = self.nodes[0]
         self.username = username
         self.password = password
         self.is_ssl = connect_args.get('is_ssl', False)
@@ -44,16 +64,200 @@ class Kylin(object):
         self.version = connect_args.get('version', 'v1')
         self.is_pushdown = bool(connect_args.get('is_pushdown', False))
         self.is_debug = bool(connect_args.get('is_debug', False))
+        self.keep_alive = as_bool(connect_args.get('keep_alive', True))
+        self.pool_maxsize = int(connect_args.get('pool_maxsize', 10))
+        self.pool_idle_timeout = float(connect_args.get('pool_idle_timeout', 60))
+        self.compression = as_bool(connect_args.get('compression', True))
+        self.stream_results = as_bool(connect_args.get('stream_results', False))
+        self.query_page_size = int(connect_args.get('query_page_size', 0))
+        self.query_max_rows = int(connect_args.get('query_max_rows', 0))
+        self.query_prefetch = int(connect_args.get('query_prefetch', 0))
+        self.export_workers = int(connect_args.get('export_workers', 4))
+        self.json_codec = get_codec(connect_args.get('json_codec', 'auto'))
+        self.balancer = connect_args.get('balancer', 'round_robin')
+        self.health_check_interval = float(connect_args.get('health_check_interval', 10))
+        self.retry_max_attempts = int(connect_args.get('retry_max_attempts', 3))
+        self.retry_backoff = float(connect_args.get('retry_backoff', 0.5))
+        self.retry_read_timeouts = bool(int(connect_args.get('retry_read_timeouts', 0)))
+        self.breaker_threshold = int(connect_args.get('breaker_threshold', 5))
+        self.breaker_reset_timeout = float(connect_args.get('breaker_reset_timeout', 30))
+        self.max_concurrency = int(connect_args.get('max_concurrency', 0))
+        self.max_rps = float(connect_args.get('max_rps', 0))
+        self.limit_scope = connect_args.get('limit_scope', 'host')
+        self.limit_timeout = float(connect_args.get('limit_timeout', 30))
+        self.auth = connect_args.get('auth', 'basic')
+        self.metadata_ttl = float(connect_args.get('metadata_ttl', 0))
+        self.metadata_stale_ttl = float(connect_args.get('metadata_stale_ttl', 600))
+        self.metadata_cache_size = int(connect_args.get('metadata_cache_size', 256))
+        self.metadata_snapshot = connect_args.get('metadata_snapshot')
+        self.metadata_poll_interval = float(connect_args.get('metadata_poll_interval', 0))
+        self.warmup_on_connect = as_bool(connect_args.get('warmup', False))
+        self.warmup_workers = int(connect_args.get('warmup_workers', 4))
+        if self.auth not in ('basic', 'session'):
+            raise ValueError("Unknown auth: {}, expected 'basic' or 'session'".format(self.auth))
         self.scheme = 'https' if self.is_ssl else 'http'
         self.project = project
+        self.pool = PoolManager(maxsize=self.pool_maxsize, idle_timeout=self.pool_idle_timeout)
+        self.limits = Limits(
+            max_concurrency=self.max_concurrency,
+            rate=self.max_rps,
+            max_wait=self.limit_timeout,
+            scope=self.limit_scope,
+            cluster='{}://{}:{}'.format(self.scheme, self.host, self.port),
+            project=self.project,
+        )
+        self.breakers = None
+        if self.breaker_threshold > 0:
+            self.breakers = CircuitBreakers(
+                failure_threshold=self.breaker_threshold,
+                reset_timeout=self.breaker_reset_timeout,
+            )
+        self.node_set = None
+        if len(self.nodes) > 1:
+            self.node_set = NodeSet(
+                ['{}://{}:{}'.format(self.scheme, h, p) for (h, p) in self.nodes],
+                balancer=self.balancer,
+                health_check_interval=self.health_check_interval,
+                health_check_timeout=min(self.timeout, 5),
+            )
+        self.transfer_stats = TransferStats()
+        self.retry_policy = RetryPolicy(
+            max_attempts=self.retry_max_attempts,
+            backoff_factor=self.retry_backoff,
+            retry_read_timeouts=self.retry_read_timeouts,
+        )
+        self.session = None
+        self.metadata_cache = None
+        if self.metadata_ttl > 0:
+            self.metadata_cache = MetadataCache(
+                ttl=self.metadata_ttl,
+                stale_ttl=self.metadata_stale_ttl,
+                maxsize=self.metadata_cache_size,
+                store=MetadataSnapshot(self.metadata_snapshot) if self.metadata_snapshot else None,
+                namespace='{}://{}:{}{}/{}'.format(self.scheme, self.host, self.port, self.prefix, self.project),
+            )
+        self.change_detector = None
+        if self.metadata_cache is not None:
+            self.change_detector = ChangeDetector(
+                lambda: self.service,
+                self.metadata_cache,
+                SOURCES.get(self.version, ()),
+                interval=self.metadata_poll_interval,
+            )
+            if self.metadata_poll_interval > 0:
+                self.change_detector.start()
+        self.hooks = Hooks()
         if self.is_debug:
             logging.basicConfig(level=logging.DEBUG)
+            self.hooks.register('before_request', debug_log_hook(mask_auth=False))
+        self._cached = {}
+        self._cached_lock = threading.Lock()
+        if self.warmup_on_connect:
+            self.warmup()
+
+    @staticmethod
+    def _strip_scheme(host):
+        if host.startswith(('http://', 'https://')):
+            _, host = host.split('://')
+        return host
+
+    @classmethod
+    def _parse_node(cls, host, default_port):
+        host = cls._strip_scheme(host)
+        if host.count(':') == 1:
+            host, port = host.split(':')
+            return host, int(port)
+        return host, default_port
+
+    def _settings_key(self):
+        return (
+            self.version, self.project, self.scheme, self.host, self.port, self.username, self.password,
+            self.prefix, self.timeout, self.unverified, self.is_debug, self.keep_alive, self.compression,
+            self.auth,
+        )
+
+    def _get_cached(self, name, build):
+        """
+        :return: the object `build()` made for the current connection settings,
+            built again only after one of them was changed
+        """
+        key = self._settings_key()
+        cached = self._cached.get(name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        with self._cached_lock:
+            cached = self._cached.get(name)
+            if cached is None or cached[0] != key:
+                cached = self._cached[name] = (key, build())
+            return cached[1]
 
     @property
     def service(self):
-        return SERVICES[self.version](self._get_client(), self.project)
+        return self._get_cached(
+            'service', lambda: SERVICES[self.version](self._get_client(), self.project, cache=self.metadata_cache))
 
-    def _get_client(self):
+    def invalidate(self, name=None):
+        """
+        Drop cached metadata, of one endpoint like 'tables_and_columns' or 'cube_desc', or all of it.
+        """
+        if self.metadata_cache is not None:
+            self.metadata_cache.invalidate(name)
+
+    def refresh_metadata(self):
+        """
+        Refetch the cached model and cube descriptions changed since the last call, see `ChangeDetector`.
+
+        :return: dict of 'model_desc'/'cube_desc' to the names refetched, and 'tables'
+        """
+        if self.change_detector is None:
+            return {}
+        return self.change_detector.poll()
+
+    def warmup(self, max_workers=None, connections=None):
+        """
+        Preload the project metadata with concurrent requests and open
+        keep-alive connections, so that the first queries do not wait for them.
+
+        The lists of projects, tables, models and cubes are fetched first, then
+        the description of every model and cube. Failures are logged, the
+        metadata they miss is fetched again on first use.
+
+        :param max_workers: requests in flight at once, `warmup_workers` by default
+        :param connections: idle connections kept open to each node, `max_workers` by default
+        :return: dict of 'requests', 'errors' and the 'connections' opened
+        """
+        max_workers = max_workers or self.warmup_workers
+        service = self.service
+        errors = []
+
+        def fetch(call):
+            name, args = call
+            try:
+                return getattr(service, name)(*args)
+            except Exception as err:
+                errors.append(err)
+                logger.warning('Warming up {}{} failed: {!r}'.format(name, args, err))
+                return None
+
+        lists = ['projects', 'tables_in_hive' if self.is_pushdown else 'tables_and_columns', 'models']
+        if self.version != 'v4':
+            lists.append('cubes')
+        results = dict(zip(lists, map_concurrently(fetch, [(name, ()) for name in lists], max_workers)))
+
+        descriptions = []
+        if self.version != 'v4':
+            # v4 model lists already carry the whole description
+            descriptions += [('model_desc', (model['name'],)) for model in results['models'] or ()]
+            descriptions += [('cube_desc', (cube['name'],)) for cube in results['cubes'] or ()]
+        map_concurrently(fetch, descriptions, max_workers)
+
+        return {
+            'requests': len(lists) + len(descriptions),
+            'errors': len(errors),
+            'connections': service.client.preconnect(connections or max_workers),
+        }
+
+    def _get_headers(self):
         headers = {
             'User-Agent': 'Kylin Python Client',
         }
@@ -66,7 +270,25 @@ class Kylin(object):
 
         if self.username and self.password:
             headers.update(self.basic_auth_dump(self.username, self.password))
+        return headers
+
+    def _authenticate(self, client):
+        SERVICES[self.version](client, self.project).get_authentication()
 
+    def _get_session(self):
+        if self.auth != 'session' or not (self.username and self.password):
+            return None
+        auth_headers = self.basic_auth_dump(self.username, self.password)
+        if self.session is None or self.session.auth_headers != auth_headers:
+            self.session = Session(auth_headers, self._authenticate)
+        return self.session
+
+    def _get_client(self):
+        headers = self._get_headers()
+        session = self._get_session()
+        if session is not None:
+            # the session cookie, or the session's basic auth fallback, authenticates instead
+            headers.pop('Authorization', None)
         return HTTPClient(
             host='{self.scheme}://{self.host}:{self.port}'.format(**locals()),
             prefix=self.prefix,
@@ -74,8 +296,33 @@ class Kylin(object):
             request_headers=headers,
             unverified=self.unverified,
             is_debug=self.is_debug,
+            keep_alive=self.keep_alive,
+            pool=self.pool,
+            compression=self.compression,
+            stats=self.transfer_stats,
+            codec=self.json_codec,
+            nodes=self.node_set,
+            retry=self.retry_policy,
+            breakers=self.breakers,
+            limits=self.limits,
+            hooks=self.hooks,
+            session=session,
         )
 
+    @property
+    def breaker_states(self):
+        """
+        :return: dict of 'scheme://host:port' to 'closed', 'open' or 'half_open', for metrics
+        """
+        return self.breakers.states if self.breakers is not None else {}
+
+    def close(self):
+        if self.change_detector is not None:
+            self.change_detector.stop()
+        if self.node_set is not None:
+            self.node_set.close()
+        self.pool.clear()
+
     def basic_auth_dump(self, username, password):
         _auth = as_unicode('{}:{}').format(username, password)
         _auth = base64.b64encode(_auth.encode('utf-8')).decode('ascii')
@@ -87,6 +334,38 @@ class Kylin(object):
     def query(self, sql, **parameters):
         return self.service.query(sql, **parameters)
 
+    def query_pages(self, sql, page_size=None, max_rows=None, prefetch=None, **parameters):
+        """
+        :param page_size: rows per /query request, `query_page_size` by default
+        :param max_rows: safety cap of the rows fetched, `query_max_rows` by default
+        :param prefetch: pages fetched ahead in the background, `query_prefetch` by default
+        :return: `QueryPages` iterating the rows of `sql` page by page
+        """
+        parameters.pop('stream', None)
+        page_size = page_size or self.query_page_size or WINDOW_SIZE
+        max_rows = self.query_max_rows if max_rows is None else max_rows
+        prefetch = self.query_prefetch if prefetch is None else prefetch
+        return QueryPages(self.query, sql, page_size, max_rows=max_rows, prefetch=prefetch, **parameters)
+
+    def export(self, sql, sink, page_size=None, max_rows=None, workers=None, **parameters):
+        """
+        Fetch the result of `sql`, which needs an ORDER BY, in limit/offset
+        windows requested `workers` at once and spread over the query nodes.
+
+        :param sink: called with the list of rows of each window, in order
+        :param page_size: rows per window, `query_page_size` by default
+        :param max_rows: safety cap of the rows fetched, `query_max_rows` by default
+        :param workers: windows fetched at once, `export_workers` by default
+        :return: the number of rows passed to `sink`
+        """
+        workers = workers or self.export_workers
+        pages = self.query_pages(sql, page_size=page_size, max_rows=max_rows, prefetch=workers, **parameters)
+        num_rows = 0
+        for rows in pages.iter_pages():
+            sink(rows)
+            num_rows += len(rows)
+        return num_rows
+
     def get_all_tables(self, schema=None):
         if self.is_pushdown:
             _full_names = sorted(list(self.service.tables_in_hive().keys()))
@@ -119,16 +398,8 @@ class Kylin(object):
 
     def get_datasource(self, name):
         if self.version == 'v4':
-            _params = {
-                'project': self.project,
-                'page_offset': 0,
-                'page_size': 1000,
-                'model_name': name,
-                'exact': True,
-            }
-            model_desc = self.service.models(params=_params)[0]
             return KE4ModelSource(
-                model_desc=model_desc,
+                model_desc=self.service.model(name),
                 tables_and_columns=self.service.tables_and_columns(),
                 service=self.service,
             )
@@ -144,6 +415,51 @@ class Kylin(object):
             service=self.service,
         )
 
+    def get_datasources(self, names, max_workers=4):
+        """
+        Load many datasources at once. The tables, and for v1/v2 the model list,
+        are fetched once and shared by all the datasources, the cube descriptions,
+        or v4 models, concurrently.
+
+        :param max_workers: requests in flight at once
+        :return: list of `CubeSource`, or `KE4ModelSource` for v4, in the order of `names`
+        """
+        names = list(names)
+        service = self.service
+        calls = [('tables_and_columns', ())]
+        if self.version == 'v4':
+            # the model list is paged, each model is looked up by name
+            calls += [('model', (name,)) for name in names]
+        else:
+            calls += [('models', ())] + [('cube_desc', (name,)) for name in names]
+        results = map_concurrently(lambda call: getattr(service, call[0])(*call[1]), calls, max_workers)
+        tables_and_columns = results[0]
+
+        if self.version == 'v4':
+            missing = [name for name, model in zip(names, results[1:]) if model is None]
+            if missing:
+                raise KylinCubeError('No Model found: {}'.format(', '.join(missing)))
+            return [
+                KE4ModelSource(model_desc=model, tables_and_columns=tables_and_columns, service=service)
+                for model in results[1:]
+            ]
+
+        models = dict((model.get('name'), model) for model in results[1] or ())
+        datasources = []
+        for name, cube_desc in zip(names, results[2:]):
+            if cube_desc is None:
+                raise KylinCubeError('No Cube found: {}'.format(name))
+            model_desc = models.get(cube_desc.get('model_name'))
+            if model_desc is None:
+                raise KylinCubeError('No Model found: {}'.format(cube_desc.get('model_name')))
+            datasources.append(CubeSource(
+                cube_desc=cube_desc,
+                model_desc=model_desc,
+                tables_and_columns=tables_and_columns,
+                service=service,
+            ))
+        return datasources
+
     def list_datasources(self):
         if self.version == 'v4':
             return [models.get('name') for models in self.service.models()]
@@ -159,6 +475,26 @@ class Kylin(object):
         else:
             return [self.get_job(job_id=job['uuid']) for job in jobs]
 
+    def iter_projects(self, page_size=PAGE_SIZE, prefetch=1):
+        """
+        Stream the projects `page_size` at a time, fetching the next `prefetch` pages ahead.
+        The `iter_*` methods return every item, where the list methods stop at one page.
+        """
+        return self.service.iter_projects(page_size=page_size, prefetch=prefetch)
+
+    def iter_tables(self, page_size=PAGE_SIZE, prefetch=1):
+        return self.service.iter_tables(page_size=page_size, prefetch=prefetch)
+
+    def iter_models(self, page_size=PAGE_SIZE, prefetch=1):
+        return self.service.iter_models(page_size=page_size, prefetch=prefetch)
+
+    def iter_cubes(self, page_size=PAGE_SIZE, prefetch=1):
+        return self.service.iter_cubes(page_size=page_size, prefetch=prefetch)
+
+    def iter_jobs(self, page_size=PAGE_SIZE, prefetch=1, **query_params):
+        for job in self.service.iter_jobs(page_size=page_size, prefetch=prefetch, **query_params):
+            yield self.get_job(job_id=job['id'] if self.version == 'v4' else job['uuid'])
+
     def __str__(self):
         if self.project:
             dsn = ('{self.scheme}://'
@@ -175,12 +511,17 @@ class Kylin(object):
         return '<Kylinpy instance: {}>'.format(str(self))
 
 
-def create_kylin(dsn):
+def _parse_dsn(dsn):
     url = urlparse(dsn)
     project = url.path.lstrip('/')
     port = url.port or 7070
     query = dict(parse_qsl(url.query) or {})
-    return Kylin(url.hostname, url.username, url.password, port, project, **query)
+    return (url.hostname, url.username, url.password, port, project), query
+
+
+def create_kylin(dsn):
+    args, query = _parse_dsn(dsn)
+    return Kylin(*args, **query)
 
 
 # For compatibility with older versions
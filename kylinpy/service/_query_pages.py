@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import itertools
+import re
+
+from kylinpy.logger import logger
+from kylinpy.utils.workers import ConcurrentMap
+
+WINDOW_SIZE = 10000
+
+_ORDER_BY = re.compile(r'\border\s+by\b', re.IGNORECASE)
+
+
+class QueryPages(object):
+    """
+    The rows of a query fetched `page_size` at a time with the /query
+    `limit` and `offset` as they are iterated, only a few pages are held
+    in memory. Pages only line up for a query with an ORDER BY.
+
+    `limit` caps the rows of the whole result, `max_rows` is a safety cap
+    logging a warning when it cuts a result short, one more row is fetched
+    to tell. 0 leaves them unlimited.
+
+    While a page is iterated the next `prefetch` pages are fetched at once
+    on a pool of worker threads, each request balanced to a query node of
+    its own, so up to `prefetch` + 1 pages are held in memory.
+    """
+
+    def __init__(self, query, sql, page_size, max_rows=0, prefetch=0, offset=0, limit=None, **parameters):
+        self._query = query
+        self.sql = sql
+        self.page_size = page_size
+        self.max_rows = max_rows
+        self.prefetch = prefetch
+        self.start = offset or 0
+        self.parameters = parameters
+        caps = [n for n in (limit, max_rows) if n]
+        self.total = min(caps) if caps else None
+        self._capped = bool(max_rows) and self.total == max_rows and limit != max_rows
+        # the row past max_rows tells a result cut short from one of exactly max_rows
+        self._fetch_total = self.total + 1 if self._capped else self.total
+        # offset of the first short page, the workers fetching ahead take no offset past it
+        self._end = None
+        first = self._fetch(self.start)
+        self.column_metas = first.get('columnMetas')
+        self._first = first['results']
+
+    def _page_limit(self, offset):
+        if self._fetch_total is None:
+            return self.page_size
+        return min(self.page_size, self.start + self._fetch_total - offset)
+
+    def _fetch(self, offset):
+        limit = self._page_limit(offset)
+        page = self._query(self.sql, limit=limit, offset=offset, **self.parameters)
+        if len(page['results']) < limit and (self._end is None or offset < self._end):
+            self._end = offset
+        return page
+
+    def _fetch_ahead(self, offset):
+        """
+        :return: iterator of the pages from `offset` on, fetched `prefetch` at once
+        """
+        offsets = itertools.takewhile(
+            lambda o: self._page_limit(o) > 0 and (self._end is None or o < self._end),
+            itertools.count(offset, self.page_size),
+        )
+        if self.prefetch > 0:
+            return ConcurrentMap(self._fetch, offsets, max_workers=self.prefetch, name='kylinpy-query-page')
+        return (self._fetch(o) for o in offsets)
+
+    def iter_pages(self):
+        """
+        :return: iterator of the lists of rows of each page, in order
+        """
+        rows, offset = self._first, self.start
+        self._first = None
+        ahead = None
+        try:
+            while rows is not None:
+                limit = self._page_limit(offset)
+                if ahead is None and len(rows) == limit:
+                    if not _ORDER_BY.search(self.sql):
+                        logger.warning('Paging through the result of {!r} without an ORDER BY, '
+                                       'its pages may overlap or miss rows'.format(self.sql))
+                    # pages ahead are only fetched after a full page, they start at multiples of page_size
+                    ahead = self._fetch_ahead(offset + self.page_size)
+                if self._capped and offset + len(rows) > self.start + self.total:
+                    yield rows[:self.start + self.total - offset]
+                    logger.warning('Stopped fetching the result of {!r} at max_rows={}'.format(
+                        self.sql, self.max_rows))
+                    return
+                yield rows
+                offset += len(rows)
+                if len(rows) < limit or self._page_limit(offset) <= 0:
+                    return
+                rows = next(ahead)['results']
+        finally:
+            if ahead is not None:
+                ahead.close()
+
+    def __iter__(self):
+        for rows in self.iter_pages():
+            for row in rows:
+                yield row
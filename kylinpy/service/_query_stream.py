@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from collections import deque
+
+from kylinpy.exceptions import KylinQueryError
+from kylinpy.utils.json_stream import CHUNK_SIZE, JSONStreamReader
+
+
+class QueryResultStream(object):
+    """
+    A /query response whose `results` are parsed row by row as they are
+    read from the socket. Every other field of the response is kept in `meta`.
+    """
+
+    def __init__(self, fp, path=(), chunk_size=CHUNK_SIZE):
+        self._fp = fp
+        self._reader = JSONStreamReader(fp, chunk_size)
+        self._path = tuple(path)
+        self._events = self._walk(self._path)
+        self._pending_rows = deque()
+        self._done = False
+        self.meta = {}
+        self.envelope = {}
+
+    def _walk(self, path):
+        reader = self._reader
+        for key in reader.iter_object():
+            if path:
+                if key == path[0] and reader.peek() == '{':
+                    for row in self._walk(path[1:]):
+                        yield row
+                else:
+                    self.envelope[key] = reader.read_value()
+            elif key == 'results' and reader.peek() == '[':
+                for row in reader.iter_array():
+                    yield row
+            else:
+                self.meta[key] = reader.read_value()
+
+    def _next_row(self):
+        try:
+            return next(self._events)
+        except StopIteration:
+            self._done = True
+            self.close()
+            raise
+
+    def _read_until(self, key):
+        while key not in self.meta and not self._done:
+            try:
+                self._pending_rows.append(self._next_row())
+            except StopIteration:
+                break
+        return self.meta.get(key)
+
+    def _raise_for_error(self):
+        err_message = self.meta.get('exceptionMessage')
+        if err_message:
+            raise KylinQueryError(err_message)
+
+    @property
+    def column_metas(self):
+        column_metas = self._read_until('columnMetas')
+        if not column_metas:
+            # failed queries come without column metas, the error is further on
+            self._read_until('exceptionMessage')
+        self._raise_for_error()
+        return column_metas
+
+    def __iter__(self):
+        while True:
+            while self._pending_rows:
+                yield self._pending_rows.popleft()
+            if self._done:
+                break
+            try:
+                row = self._next_row()
+            except StopIteration:
+                break
+            yield row
+        self._raise_for_error()
+
+    def to_dict(self):
+        """
+        :return: the whole response as `KylinService.query` returns it
+        """
+        results = list(self)
+        rv = dict(self.meta)
+        rv['results'] = results
+        return rv
+
+    def close(self):
+        self._done = True
+        close = getattr(self._fp, 'close', None)
+        if close is not None:
+            close()
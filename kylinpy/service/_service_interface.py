@@ -4,10 +4,206 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import functools
+import json
+from collections import deque
+
+from kylinpy.client import InternalServerError, UnauthorizedError
+from kylinpy.exceptions import KylinQueryError
+from kylinpy.logger import logger
+from kylinpy.utils.singleflight import SingleFlight
+from kylinpy.utils.workers import Future
+
+# shared by every service of the process, services are short-lived
+metadata_flight = SingleFlight()
+
+# items per request of the `iter_*` list iterators, and the most pages they fetch
+PAGE_SIZE = 100
+MAX_PAGES = 10000
+
+
+def call_key(service, name, args, kwargs):
+    """
+    :return: the key of a call of `service` shared by the calls with the same
+        arguments, project, host and credentials, of sync and asyncio services alike
+    """
+    client = service.client
+    headers = dict(client.request_headers)
+    session = getattr(client, 'session', None)
+    if session is not None:
+        # session clients carry their credentials on the session, not the headers
+        headers.update(session.auth_headers)
+    return (
+        service.api_version,
+        name,
+        service.project,
+        client.host,
+        client.prefix,
+        json.dumps([sorted(headers.items()), args, kwargs], sort_keys=True, default=repr),
+    )
+
+
+def coalesced(fn):
+    """
+    Concurrent calls with the same arguments, project, host and credentials
+    share one request, see `SingleFlight`. Services with a metadata `cache`
+    answer from it first, see `MetadataCache`.
+    """
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        key = call_key(self, fn.__name__, args, kwargs)
+        fetch = functools.partial(metadata_flight.do, key, lambda: fn(self, *args, **kwargs))
+        cache = getattr(self, 'cache', None)
+        if cache is None:
+            return fetch()
+        return cache.get(key, fn.__name__, fetch, args)
+    return wrapper
+
+
+class Call(object):
+    """
+    One request of a service method, built by the `*Endpoints` classes
+    that sync and asyncio services share.
+
+    :param api: name of the `_Api` function sync services send it with
+    :param method: HTTP method asyncio services send it with
+    :param result: turns the response into the return value of the method
+    :param error: exception raised in place of an `InternalServerError`
+    """
+
+    def __init__(self, api, method, endpoint, kwargs=None, result=None, error=None):
+        self.api = api
+        self.method = method
+        self.endpoint = endpoint
+        self.kwargs = kwargs or {}
+        self.result = result or _identity
+        self.error = error
+
+
+def _identity(rv):
+    return rv
+
+
+def authenticated(rv):
+    if rv == {}:
+        raise UnauthorizedError
+    return rv
+
+
+def query_result(response):
+    err_message = response.get('exceptionMessage')
+    if err_message:
+        raise KylinQueryError(err_message)
+    return response
+
+
+class QueryEndpoint(object):
+    def _query(self, sql, limit=50000, offset=0, acceptPartial=False, stream=False, **kwargs):
+        json_data = {
+            'acceptPartial': acceptPartial,
+            'limit': limit,
+            'offset': offset,
+            'project': self.project,
+            'sql': sql,
+        }
+        kwargs.setdefault('json', json_data)
+        if stream:
+            return Call('query_stream', 'post', '/query', kwargs, error=KylinQueryError)
+        return Call('query', 'post', '/query', kwargs, result=query_result, error=KylinQueryError)
+
+
+def tables_and_columns_map(resp):
+    tbl_pair = tuple(('{}.{}'.format(tbl.get('table_SCHEM'), tbl.get('table_NAME')), tbl) for tbl in resp)
+    for tbl in tbl_pair:
+        tbl[1]['columns'] = [(col['column_NAME'], col) for col in tbl[1]['columns']]
+    return dict(tbl_pair)
+
+
+def tables_in_hive_map(tables):
+    __tables_in_hive = {}
+    for tbl in tables:
+        db = tbl['database']
+        name = tbl['name']
+        fullname = '{}.{}'.format(db, name)
+        __tables_in_hive[fullname] = tbl
+
+    return __tables_in_hive
+
+
+def _item_id(item):
+    if isinstance(item, dict):
+        return item.get('uuid') or item.get('id')
+    return None
+
+
+def iter_pages(fetch_page, page_size=PAGE_SIZE, prefetch=1, max_pages=MAX_PAGES):
+    """
+    Yield the items of a paginated list endpoint, page after page, until a
+    page comes back with fewer items than asked for. The next `prefetch`
+    pages are fetched in the background while the current one is consumed,
+    so at most `prefetch` + 1 pages are held in memory.
+
+    A short first page is either the whole list or the most items the
+    server answers at once: the next page is asked for in pages of that
+    size, the list goes on if it is not empty.
+
+    Items seen on an earlier page are skipped by their `uuid` or `id`, a
+    list changing while it is iterated shifts items across pages. Servers
+    ignoring the paging parameters answer the same page again, the
+    iteration stops there, and after `max_pages` pages in any case.
+
+    :param fetch_page: callable taking the page index and size, returning a list of items
+    """
+    pages = deque()
+    index = 0
+    previous = None
+    probing = False
+    seen = set()
+    while True:
+        while len(pages) <= prefetch and index < max_pages:
+            pages.append(Future(fetch_page, index, page_size))
+            index += 1
+        if not pages:
+            logger.warning('Stopped listing after {} pages of {} items'.format(max_pages, page_size))
+            return
+        items = pages.popleft().result() or []
+        if items and items == previous:
+            if not probing:
+                logger.warning('The server repeated a page, it ignores the paging parameters')
+            return
+        for item in items:
+            item_id = _item_id(item)
+            if item_id is not None:
+                if item_id in seen:
+                    continue
+                seen.add(item_id)
+            yield item
+        # a longer page means the server ignored the paging parameters
+        if len(items) > page_size or not items:
+            return
+        if len(items) < page_size:
+            if previous is not None:
+                return
+            # the pages in flight were asked for at the old size
+            page_size, index, probing = len(items), 1, True
+            pages.clear()
+        else:
+            probing = False
+        previous = items
+
 
 class ServiceInterface(object):
-    def query(self, sql, limit=50000, offset=0, acceptPartial=False, **kwargs):
-        raise NotImplementedError()
+    def _send(self, call):
+        try:
+            rv = getattr(self.api, call.api)(self.client, call.endpoint, **call.kwargs)
+        except InternalServerError as err:
+            if call.error is None:
+                raise
+            raise call.error(err)
+        return call.result(rv)
+
+    def query(self, sql, limit=50000, offset=0, acceptPartial=False, stream=False, **kwargs):
+        return self._send(self._query(sql, limit, offset, acceptPartial, stream, **kwargs))
 
     def projects(self, **kwargs):
         raise NotImplementedError()
@@ -38,3 +234,18 @@ class ServiceInterface(object):
 
     def get_authentication(self, **kwargs):
         raise NotImplementedError()
+
+    def iter_projects(self, page_size=PAGE_SIZE, prefetch=1):
+        raise NotImplementedError()
+
+    def iter_jobs(self, page_size=PAGE_SIZE, prefetch=1, **params):
+        raise NotImplementedError()
+
+    def iter_tables(self, page_size=PAGE_SIZE, prefetch=1):
+        raise NotImplementedError()
+
+    def iter_models(self, page_size=PAGE_SIZE, prefetch=1):
+        raise NotImplementedError()
+
+    def iter_cubes(self, page_size=PAGE_SIZE, prefetch=1):
+        raise NotImplementedError()
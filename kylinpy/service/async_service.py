@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import asyncio
+import copy
+import functools
+
+from kylinpy.client import InternalServerError
+from kylinpy.exceptions import KylinQueryError
+from kylinpy.logger import logger
+from kylinpy.utils.cache import MISS, REFRESH
+from ._service_interface import call_key
+from .kylin_service import KylinEndpoints
+from .ke3_service import KE3Endpoints
+from .ke4_service import KE4Endpoints
+
+
+class AsyncSingleFlight(object):
+    """
+    `SingleFlight` for coroutines: callers arriving while a call with the
+    same key is in flight on their event loop await it and get a deep copy
+    of its result, or its exception.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.num_calls = 0
+        self.num_coalesced = 0
+
+    async def do(self, key, fn):
+        loop = asyncio.get_event_loop()
+        entry = self._calls.get((loop, key))
+        if entry is not None:
+            call = entry[0]
+            entry[1] += 1
+            self.num_coalesced += 1
+            try:
+                return copy.deepcopy(await asyncio.shield(call))
+            except asyncio.CancelledError:
+                if not call.cancelled():
+                    raise
+            # the caller leading the call was cancelled, go on without it
+            return await self.do(key, fn)
+
+        call = loop.create_future()
+        entry = self._calls[(loop, key)] = [call, 0]
+        self.num_calls += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            call.cancel()
+            raise
+        except BaseException as err:
+            call.set_exception(err)
+            # retrieved, nobody may be waiting for it
+            call.exception()
+            raise
+        finally:
+            del self._calls[(loop, key)]
+        # the leader may mutate its result, followers copy a snapshot
+        call.set_result(copy.deepcopy(result) if entry[1] else result)
+        return result
+
+
+# shared by every asyncio service of the process
+async_metadata_flight = AsyncSingleFlight()
+_refreshing = set()
+
+
+async def _cached(cache, key, name, args, fetch):
+    """`MetadataCache.get` for coroutines, stale values are refreshed by a task."""
+    if cache.ttl(name) <= 0:
+        return await fetch()
+    state, value, generation = cache.lookup(key, name, args)
+    if state == MISS:
+        value = await fetch()
+        cache.put(key, name, args, value, generation)
+    elif state == REFRESH:
+        task = asyncio.ensure_future(_refresh(cache, key, name, args, fetch, generation))
+        # the loop only keeps weak references to tasks
+        _refreshing.add(task)
+        task.add_done_callback(_refreshing.discard)
+    return value
+
+
+async def _refresh(cache, key, name, args, fetch, generation):
+    try:
+        cache.put(key, name, args, await fetch(), generation)
+    except Exception as err:
+        logger.warning('Refreshing {} failed, serving the stale value: {!r}'.format(name, err))
+    finally:
+        cache.refreshed(key)
+
+
+def coalesced(fn):
+    """`_service_interface.coalesced` for coroutines, keyed like the sync calls so both share the cache."""
+    @functools.wraps(fn)
+    async def wrapper(self, *args, **kwargs):
+        key = call_key(self, fn.__name__, args, kwargs)
+
+        async def fetch():
+            return await async_metadata_flight.do(key, lambda: fn(self, *args, **kwargs))
+        if self.cache is None:
+            return await fetch()
+        return await _cached(self.cache, key, fn.__name__, args, fetch)
+    return wrapper
+
+
+class _AsyncApi(object):
+    """
+    For testing convenience, v2 and v4 responses are unwrapped from `data`
+    """
+    @staticmethod
+    async def request(client, method, endpoint, unwrap=False, **kwargs):
+        rv = (await getattr(client, method)(endpoint=endpoint, **kwargs)).json()
+        return rv.get('data') if unwrap else rv
+
+
+class _AsyncService(object):
+    """
+    Coroutine version of the read-only part of the services, the requests
+    are built by the `*Endpoints` class of the version. Maintenance calls
+    such as build or drop stay on the synchronous services.
+    """
+    api = _AsyncApi
+    unwrap = False
+
+    def __init__(self, client, project=None, cache=None):
+        self.client = client
+        self.project = project
+        self.cache = cache
+
+    async def _send(self, call):
+        try:
+            rv = await self.api.request(self.client, call.method, call.endpoint, unwrap=self.unwrap, **call.kwargs)
+        except InternalServerError as err:
+            if call.error is None:
+                raise
+            raise call.error(err)
+        return call.result(rv)
+
+    async def query(self, sql, limit=50000, offset=0, acceptPartial=False, stream=False, **kwargs):
+        if stream:
+            raise KylinQueryError('Streaming results are not supported by the asyncio client')
+        return await self._send(self._query(sql, limit, offset, acceptPartial, **kwargs))
+
+    @coalesced
+    async def projects(self, **kwargs):
+        return await self._send(self._projects(**kwargs))
+
+    async def jobs(self, **params):
+        return await self._send(self._jobs(**params))
+
+    @coalesced
+    async def tables_and_columns(self, **kwargs):
+        return await self._send(self._tables_and_columns(**kwargs))
+
+    @coalesced
+    async def tables_in_hive(self, **kwargs):
+        return await self._send(self._tables_in_hive(**kwargs))
+
+    @coalesced
+    async def models(self, **kwargs):
+        return await self._send(self._models(**kwargs))
+
+    async def get_authentication(self, **kwargs):
+        return await self._send(self._authentication(**kwargs))
+
+
+class _AsyncCubeService(_AsyncService):
+    """Cubes of Apache Kylin and Kyligence Enterprise 3, their models come from the model list."""
+
+    @coalesced
+    async def cube_desc(self, name, **kwargs):
+        return await self._send(self._cube_desc(name, **kwargs))
+
+    @coalesced
+    async def model_desc(self, name, **kwargs):
+        return [_ for _ in await self.models(**kwargs) if _.get('name') == name][0]
+
+    @coalesced
+    async def cubes(self, name=None, **kwargs):
+        return await self._send(self._cubes(name, **kwargs))
+
+
+class AsyncKylinService(KylinEndpoints, _AsyncCubeService):
+    async def job_desc(self, job_id):
+        return await self._send(self._job_desc(job_id))
+
+
+class AsyncKE3Service(KE3Endpoints, _AsyncCubeService):
+    unwrap = True
+
+
+class AsyncKE4Service(KE4Endpoints, _AsyncService):
+    unwrap = True
+
+    async def job_desc(self, job_id):
+        return await self._send(self._job_desc(job_id))
+
+    @coalesced
+    async def model_desc(self, name, **kwargs):
+        return await self._send(self._model_desc(name, **kwargs))
+
+    @coalesced
+    async def model(self, name):
+        """
+        :return: the entry of model `name` in the model list
+        """
+        return await self._send(self._model(name))
+
+    async def list_segment(self, model_name):
+        return await self._send(self._list_segment(model_name))
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import threading
+
+from kylinpy.logger import logger
+
+# (list endpoint, description endpoint) pairs polled for each API version, the
+# descriptions are what `Kylin.get_datasource` reads: v1/v2 describe models and
+# cubes, v4 models with their entry of the model list
+SOURCES = {
+    'v1': (('models', 'model_desc'), ('cubes', 'cube_desc')),
+    'v2': (('models', 'model_desc'), ('cubes', 'cube_desc')),
+    'v4': (('models', 'model'),),
+}
+
+# project-wide table metadata, refetched when the set of models changed
+TABLE_ENDPOINTS = ('tables_and_columns', 'tables_in_hive')
+
+
+class ChangeDetector(object):
+    """
+    Keeps a `MetadataCache` fresh for the price of the list calls.
+
+    Each poll fetches the model and cube lists, compares their `uuid` and
+    `last_modified` with the previous poll and refetches only the
+    descriptions that changed. Table metadata is dropped from the cache,
+    to be fetched on next use, when models were changed, added or removed.
+    The first poll only records what is there.
+
+    :param get_service: callable returning the current service
+    """
+
+    def __init__(self, get_service, cache, sources, interval=60):
+        self.get_service = get_service
+        self.cache = cache
+        self.sources = sources
+        self.interval = interval
+        self._fingerprints = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def fingerprints(items):
+        return dict(
+            (item.get('name'), (item.get('uuid'), item.get('last_modified')))
+            for item in items or ()
+        )
+
+    def poll(self):
+        """
+        :return: dict of description endpoint to the names refetched, plus
+            'tables': whether table metadata was dropped
+        """
+        with self._lock:
+            service = self.get_service()
+            changes = {'tables': False}
+            for list_name, desc_name in self.sources:
+                # the list itself may be cached, compare a fresh one
+                with self.cache.bypass():
+                    current = self.fingerprints(getattr(service, list_name)())
+                previous = self._fingerprints.get(list_name)
+                self._fingerprints[list_name] = current
+                if previous is None:
+                    continue
+
+                changed = sorted(name for name in current if current[name] != previous.get(name))
+                removed = sorted(name for name in previous if name not in current)
+                for name in changed + removed:
+                    self.cache.invalidate(desc_name, args=(name,))
+                for name in changed:
+                    getattr(service, desc_name)(name)
+                changes[desc_name] = changed
+                if list_name == 'models' and (changed or removed):
+                    changes['tables'] = True
+
+            if changes['tables']:
+                for name in TABLE_ENDPOINTS:
+                    self.cache.invalidate(name)
+            return changes
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='kylinpy-metadata-refresh')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                changes = self.poll()
+            except Exception as err:
+                logger.warning('Metadata change detection failed: {!r}'.format(err))
+                continue
+            logger.debug('Metadata changes: {}'.format(changes))
@@ -4,9 +4,19 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from kylinpy.client import InternalServerError, UnauthorizedError
-from kylinpy.exceptions import KylinQueryError
-from ._service_interface import ServiceInterface
+from kylinpy.client import UnauthorizedError
+from ._query_stream import QueryResultStream
+from ._service_interface import (
+    PAGE_SIZE,
+    Call,
+    QueryEndpoint,
+    ServiceInterface,
+    authenticated,
+    coalesced,
+    iter_pages,
+    tables_and_columns_map,
+    tables_in_hive_map,
+)
 
 
 class _Api(object):
@@ -17,6 +27,10 @@ class _Api(object):
     def query(client, endpoint, **kwargs):
         return client.post(endpoint=endpoint, **kwargs).json().get('data')
 
+    @staticmethod
+    def query_stream(client, endpoint, **kwargs):
+        return QueryResultStream(client.post(endpoint=endpoint, stream=True, **kwargs).raw, path=('data',))
+
     @staticmethod
     def tables_and_columns(client, endpoint, **kwargs):
         return client.get(endpoint=endpoint, **kwargs).json().get('data')
@@ -57,106 +71,58 @@ class _Api(object):
         return rv
 
 
-class KE3Service(ServiceInterface):
-    api = _Api
-
-    def __init__(self, client, project=None):
-        self.client = client
-        self.project = project
-
-    def query(self, sql, limit=50000, offset=0, acceptPartial=False, **kwargs):
-        json_data = {
-            'acceptPartial': acceptPartial,
-            'limit': limit,
-            'offset': offset,
-            'project': self.project,
-            'sql': sql,
-        }
-        kwargs.setdefault('json', json_data)
-        try:
-            response = self.api.query(self.client, '/query', **kwargs)
-        except InternalServerError as err:
-            raise KylinQueryError(err)
+class KE3Endpoints(QueryEndpoint):
+    """Requests of the read calls of Kyligence Enterprise 3, shared with `AsyncKE3Service`."""
+    api_version = 'v2'
 
-        err_message = response.get('exceptionMessage')
-        if err_message:
-            raise KylinQueryError(err_message)
-
-        return response
-
-    def projects(self, **kwargs):
+    def _projects(self, **kwargs):
         params = {
             'pageOffset': 0,
             'pageSize': 1000,
         }
         kwargs.setdefault('params', params)
-        _projects = self.api.projects(self.client, '/projects', **kwargs)
-        return _projects.get('projects')
+        return Call('projects', 'get', '/projects', kwargs, result=lambda rv: rv.get('projects'))
 
-    def jobs(self, **params):
+    def _jobs(self, **params):
         _params = {
             'timeFilter': 4,
             'pageSize': 20,
             'pageOffset': 0,
         }
         _params.update(params)
-        _jobs = self.api.jobs(self.client, '/jobs', params=_params)
-        return _jobs.get('jobs')
+        return Call('jobs', 'get', '/jobs', {'params': _params}, result=lambda rv: rv.get('jobs'))
 
-    def resume_job(self, job_id, **kwargs):
-        params = {
-            'jobId': job_id,
-        }
-        kwargs.setdefault('params', params)
-        res = self.api.resume_job(self.client, '/jobs/{0}/resume'.format(job_id), **kwargs)
-        return res
-
-    def tables_and_columns(self, **kwargs):
+    def _tables_and_columns(self, **kwargs):
         params = {
             'project': self.project,
         }
         kwargs.setdefault('params', params)
-        resp = self.api.tables_and_columns(self.client, '/tables_and_columns', **kwargs)
-        tbl_pair = tuple(('{}.{}'.format(tbl.get('table_SCHEM'), tbl.get('table_NAME')), tbl) for tbl in resp)
-        for tbl in tbl_pair:
-            tbl[1]['columns'] = [(col['column_NAME'], col) for col in tbl[1]['columns']]
-        return dict(tbl_pair)
+        return Call('tables_and_columns', 'get', '/tables_and_columns', kwargs, result=tables_and_columns_map)
 
-    def tables_in_hive(self, **kwargs):
+    def _tables_in_hive(self, **kwargs):
         params = {
             'project': self.project,
             'ext': True,
         }
         kwargs.setdefault('params', params)
-        tables = self.api.tables(self.client, '/tables', **kwargs)
-
-        __tables_in_hive = {}
-        for tbl in tables:
-            db = tbl['database']
-            name = tbl['name']
-            fullname = '{}.{}'.format(db, name)
-            __tables_in_hive[fullname] = tbl
-
-        return __tables_in_hive
+        return Call('tables', 'get', '/tables', kwargs, result=tables_in_hive_map)
 
-    def cube_desc(self, name, **kwargs):
-        _cube_desc = self.api.cube_desc(self.client, '/cube_desc/{}/{}'.format(self.project, name), **kwargs)
-        return _cube_desc.get('cube')
-
-    def model_desc(self, name, **kwargs):
-        return [_ for _ in self.models(**kwargs) if _.get('name') == name][0]
+    def _cube_desc(self, name, **kwargs):
+        return Call(
+            'cube_desc', 'get', '/cube_desc/{}/{}'.format(self.project, name), kwargs,
+            result=lambda rv: rv.get('cube'),
+        )
 
-    def models(self, **kwargs):
+    def _models(self, **kwargs):
         params = {
             'projectName': self.project,
             'pageOffset': 0,
             'pageSize': 1000,
         }
         kwargs.setdefault('params', params)
-        _models = self.api.models(self.client, '/models', **kwargs)
-        return _models.get('models')
+        return Call('models', 'get', '/models', kwargs, result=lambda rv: rv.get('models'))
 
-    def cubes(self, name=None, **kwargs):
+    def _cubes(self, name=None, **kwargs):
         params = {
             'pageOffset': 0,
             'offset': 0,
@@ -165,8 +131,94 @@ class KE3Service(ServiceInterface):
             'projectName': self.project,
         }
         kwargs.setdefault('params', params)
-        _cubes = self.api.cubes(self.client, '/cubes', **kwargs)
-        return _cubes.get('cubes')
+        return Call('cubes', 'get', '/cubes', kwargs, result=lambda rv: rv.get('cubes'))
+
+    def _authentication(self, **kwargs):
+        return Call('authentication', 'get', '/user/authentication', kwargs, result=authenticated)
+
+
+class KE3Service(KE3Endpoints, ServiceInterface):
+    api = _Api
+
+    def __init__(self, client, project=None, cache=None):
+        self.client = client
+        self.project = project
+        self.cache = cache
+
+    @coalesced
+    def projects(self, **kwargs):
+        return self._send(self._projects(**kwargs))
+
+    def jobs(self, **params):
+        return self._send(self._jobs(**params))
+
+    def resume_job(self, job_id, **kwargs):
+        params = {
+            'jobId': job_id,
+        }
+        kwargs.setdefault('params', params)
+        res = self.api.resume_job(self.client, '/jobs/{0}/resume'.format(job_id), **kwargs)
+        return res
+
+    @coalesced
+    def tables_and_columns(self, **kwargs):
+        return self._send(self._tables_and_columns(**kwargs))
+
+    @coalesced
+    def tables_in_hive(self, **kwargs):
+        return self._send(self._tables_in_hive(**kwargs))
+
+    @coalesced
+    def cube_desc(self, name, **kwargs):
+        return self._send(self._cube_desc(name, **kwargs))
+
+    @coalesced
+    def model_desc(self, name, **kwargs):
+        return [_ for _ in self.models(**kwargs) if _.get('name') == name][0]
+
+    @coalesced
+    def models(self, **kwargs):
+        return self._send(self._models(**kwargs))
+
+    @coalesced
+    def cubes(self, name=None, **kwargs):
+        return self._send(self._cubes(name, **kwargs))
+
+    def iter_projects(self, page_size=PAGE_SIZE, prefetch=1):
+        def fetch(page, page_size):
+            _projects = self.api.projects(self.client, '/projects', params=self._page(page, page_size))
+            return _projects.get('projects')
+        return iter_pages(fetch, page_size, prefetch)
+
+    def iter_jobs(self, page_size=PAGE_SIZE, prefetch=1, **params):
+        def fetch(page, page_size):
+            _params = {'timeFilter': 4}
+            _params.update(params)
+            _params.update(self._page(page, page_size))
+            return self.api.jobs(self.client, '/jobs', params=_params).get('jobs')
+        return iter_pages(fetch, page_size, prefetch)
+
+    def iter_tables(self, page_size=PAGE_SIZE, prefetch=1):
+        # not paginated by Kyligence Enterprise 3
+        return iter(self.api.tables(self.client, '/tables', params={'project': self.project, 'ext': True}))
+
+    def iter_models(self, page_size=PAGE_SIZE, prefetch=1):
+        def fetch(page, page_size):
+            params = {'projectName': self.project}
+            params.update(self._page(page, page_size))
+            return self.api.models(self.client, '/models', params=params).get('models')
+        return iter_pages(fetch, page_size, prefetch)
+
+    def iter_cubes(self, page_size=PAGE_SIZE, prefetch=1):
+        def fetch(page, page_size):
+            params = {'projectName': self.project}
+            params.update(self._page(page, page_size))
+            return self.api.cubes(self.client, '/cubes', params=params).get('cubes')
+        return iter_pages(fetch, page_size, prefetch)
+
+    @staticmethod
+    def _page(page, page_size):
+        return {'pageOffset': page, 'pageSize': page_size}
 
     def get_authentication(self, **kwargs):
-        return self.api.authentication(self.client, '/user/authentication', **kwargs)
+        return self._send(self._authentication(**kwargs))
@@ -4,10 +4,21 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from kylinpy.client import InternalServerError, UnauthorizedError
-from kylinpy.exceptions import KylinQueryError, KylinJobError
+from kylinpy.client import UnauthorizedError
+from kylinpy.exceptions import KylinJobError
 from kylinpy.utils.helper import private_v4_api_warnings
-from ._service_interface import ServiceInterface
+from ._query_stream import QueryResultStream
+from ._service_interface import (
+    PAGE_SIZE,
+    Call,
+    QueryEndpoint,
+    ServiceInterface,
+    authenticated,
+    coalesced,
+    iter_pages,
+    tables_and_columns_map,
+    tables_in_hive_map,
+)
 
 
 class _Api(object):
@@ -18,6 +29,10 @@ class _Api(object):
     def query(client, endpoint, **kwargs):
         return client.post(endpoint=endpoint, **kwargs).json().get('data')
 
+    @staticmethod
+    def query_stream(client, endpoint, **kwargs):
+        return QueryResultStream(client.post(endpoint=endpoint, stream=True, **kwargs).raw, path=('data',))
+
     @staticmethod
     def tables_and_columns(client, endpoint, **kwargs):
         return client.get(endpoint=endpoint, **kwargs).json().get('data')
@@ -98,75 +113,52 @@ class _Api(object):
         return client.put(endpoint=endpoint, **kwargs).json()
 
 
-class KE4Service(ServiceInterface):
-    api = _Api
+def _value(rv):
+    return rv.get('value')
 
-    def __init__(self, client, project=None):
-        self.client = client
-        self.project = project
 
-    def query(self, sql, limit=50000, offset=0, acceptPartial=False, **kwargs):
-        json_data = {
-            'acceptPartial': acceptPartial,
-            'limit': limit,
-            'offset': offset,
-            'project': self.project,
-            'sql': sql,
-        }
-        kwargs.setdefault('json', json_data)
-        try:
-            response = self.api.query(self.client, '/query', **kwargs)
-        except InternalServerError as err:
-            raise KylinQueryError(err)
+def _job_found(job_id):
+    def result(rv):
+        rv = rv.get('value')
+        if len(rv) > 0:
+            return rv[0]
+        raise KylinJobError("Not Find this job {}".format(job_id))
+    return result
 
-        err_message = response.get('exceptionMessage')
-        if err_message:
-            raise KylinQueryError(err_message)
 
-        return response
+class KE4Endpoints(QueryEndpoint):
+    """Requests of the read calls of Kyligence Enterprise 4, shared with `AsyncKE4Service`."""
+    api_version = 'v4'
 
-    def projects(self, **kwargs):
+    def _projects(self, **kwargs):
         params = {
             'page_offset': 0,
             'page_size': 1000,
         }
         kwargs.setdefault('params', params)
-        _projects = self.api.projects(self.client, '/projects', **kwargs)
-        return _projects.get('value')
+        return Call('projects', 'get', '/projects', kwargs, result=_value)
 
-    def jobs(self, **params):
+    def _jobs(self, **params):
         _params = {
             'time_filter': 0,
         }
         _params.update(params)
-        _jobs = self.api.jobs(self.client, '/jobs', params=_params)
-        return _jobs.get('value')
+        return Call('jobs', 'get', '/jobs', {'params': _params}, result=_value)
 
-    def job_desc(self, job_id):
-        try:
-            params = {
-                'time_filter': 0,
-                'key': str(job_id),
-                'project': self.project,
-            }
-            rv = self.api.jobs(self.client, '/jobs', params=params).get('value')
-            if len(rv) > 0:
-                return rv[0]
-            else:
-                raise KylinJobError("Not Find this job {}".format(job_id))
-        except InternalServerError as e:
-            raise KylinJobError(e)
+    def _job_desc(self, job_id):
+        params = {
+            'time_filter': 0,
+            'key': str(job_id),
+            'project': self.project,
+        }
+        return Call('jobs', 'get', '/jobs', {'params': params}, result=_job_found(job_id), error=KylinJobError)
 
-    def tables_and_columns(self, **kwargs):
+    def _tables_and_columns(self, **kwargs):
         params = {'project': self.project}
         kwargs.setdefault('params', params)
-        resp = self.api.tables_and_columns(self.client, '/query/tables_and_columns', **kwargs)
-        tbl_pair = tuple(('{}.{}'.format(tbl.get('table_SCHEM'), tbl.get('table_NAME')), tbl) for tbl in resp)
-        for tbl in tbl_pair:
-            tbl[1]['columns'] = [(col['column_NAME'], col) for col in tbl[1]['columns']]
-        return dict(tbl_pair)
+        return Call('tables_and_columns', 'get', '/query/tables_and_columns', kwargs, result=tables_and_columns_map)
 
-    def tables_in_hive(self, **kwargs):
+    def _tables_in_hive(self, **kwargs):
         params = {
             'project': self.project,
             'ext': True,
@@ -174,40 +166,120 @@ class KE4Service(ServiceInterface):
             'page_size': 100000,
         }
         kwargs.setdefault('params', params)
-        tables = self.api.tables(self.client, '/tables', **kwargs)
-        tables = tables.get('value')
+        return Call('tables', 'get', '/tables', kwargs, result=lambda rv: tables_in_hive_map(rv.get('value')))
 
-        __tables_in_hive = {}
-        for tbl in tables:
-            db = tbl['database']
-            name = tbl['name']
-            fullname = '{}.{}'.format(db, name)
-            __tables_in_hive[fullname] = tbl
-
-        return __tables_in_hive
-
-    def model_desc(self, name, **kwargs):
+    def _model_desc(self, name, **kwargs):
         _url = {
             'project': self.project,
             'model_name': name,
         }
-        _model_desc = self.api.model_desc(
-            self.client,
-            '/models/{project}/{model_name}/model_desc'.format(**_url), **kwargs)
-        return _model_desc
+        return Call('model_desc', 'get', '/models/{project}/{model_name}/model_desc'.format(**_url), kwargs)
 
-    def models(self, **kwargs):
+    def _model(self, name):
+        params = {
+            'project': self.project,
+            'page_offset': 0,
+            'page_size': 1000,
+            'model_name': name,
+            'exact': True,
+        }
+        return Call('models', 'get', '/models', {'params': params}, result=lambda rv: (rv.get('value') or [None])[0])
+
+    def _models(self, **kwargs):
         params = {
             'project': self.project,
             'page_offset': 0,
             'page_size': 1000,
         }
         kwargs.setdefault('params', params)
-        _models = self.api.models(self.client, '/models', **kwargs)
-        return _models.get('value')
+        return Call('models', 'get', '/models', kwargs, result=_value)
+
+    def _list_segment(self, model_name):
+        params = {
+            'project': self.project,
+            'model_name': model_name,
+            'page_size': 2147483646,
+        }
+        return Call('list_segment', 'get', '/models/{}/segments'.format(model_name), {'params': params})
+
+    def _authentication(self, **kwargs):
+        return Call('authentication', 'get', '/user/authentication', kwargs, result=authenticated)
+
+
+class KE4Service(KE4Endpoints, ServiceInterface):
+    api = _Api
+
+    def __init__(self, client, project=None, cache=None):
+        self.client = client
+        self.project = project
+        self.cache = cache
+
+    @coalesced
+    def projects(self, **kwargs):
+        return self._send(self._projects(**kwargs))
+
+    def jobs(self, **params):
+        return self._send(self._jobs(**params))
+
+    def job_desc(self, job_id):
+        return self._send(self._job_desc(job_id))
+
+    @coalesced
+    def tables_and_columns(self, **kwargs):
+        return self._send(self._tables_and_columns(**kwargs))
+
+    @coalesced
+    def tables_in_hive(self, **kwargs):
+        return self._send(self._tables_in_hive(**kwargs))
+
+    @coalesced
+    def model_desc(self, name, **kwargs):
+        return self._send(self._model_desc(name, **kwargs))
+
+    @coalesced
+    def model(self, name):
+        """
+        :return: the entry of model `name` in the model list
+        """
+        return self._send(self._model(name))
+
+    @coalesced
+    def models(self, **kwargs):
+        return self._send(self._models(**kwargs))
+
+    def iter_projects(self, page_size=PAGE_SIZE, prefetch=1):
+        def fetch(page, page_size):
+            return self.api.projects(self.client, '/projects', params=self._page(page, page_size)).get('value')
+        return iter_pages(fetch, page_size, prefetch)
+
+    def iter_jobs(self, page_size=PAGE_SIZE, prefetch=1, **params):
+        def fetch(page, page_size):
+            _params = {'time_filter': 0}
+            _params.update(params)
+            _params.update(self._page(page, page_size))
+            return self.api.jobs(self.client, '/jobs', params=_params).get('value')
+        return iter_pages(fetch, page_size, prefetch)
+
+    def iter_tables(self, page_size=PAGE_SIZE, prefetch=1):
+        def fetch(page, page_size):
+            params = {'project': self.project, 'ext': True}
+            params.update(self._page(page, page_size))
+            return self.api.tables(self.client, '/tables', params=params).get('value')
+        return iter_pages(fetch, page_size, prefetch)
+
+    def iter_models(self, page_size=PAGE_SIZE, prefetch=1):
+        def fetch(page, page_size):
+            params = {'project': self.project}
+            params.update(self._page(page, page_size))
+            return self.api.models(self.client, '/models', params=params).get('value')
+        return iter_pages(fetch, page_size, prefetch)
+
+    @staticmethod
+    def _page(page, page_size):
+        return {'page_offset': page, 'page_size': page_size}
 
     def get_authentication(self, **kwargs):
-        return self.api.authentication(self.client, '/user/authentication', **kwargs)
+        return self._send(self._authentication(**kwargs))
 
     def fullbuild(self, model_name):
         json = {
@@ -292,13 +364,7 @@ class KE4Service(ServiceInterface):
         return res
 
     def list_segment(self, model_name):
-        params = {
-            'project': self.project,
-            'model_name': model_name,
-            'page_size': 2147483646,
-        }
-        endpoint = '/models/{}/segments'.format(model_name)
-        return self.api.list_segment(self.client, endpoint, params=params)
+        return self._send(self._list_segment(model_name))
 
     def delete_segment(self, model_name, ids, **kwargs):
         params = {
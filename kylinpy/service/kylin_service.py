@@ -5,8 +5,19 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 from kylinpy.client import InternalServerError, UnauthorizedError
-from kylinpy.exceptions import KylinQueryError, KylinCubeError, KylinJobError
-from ._service_interface import ServiceInterface
+from kylinpy.exceptions import KylinCubeError, KylinJobError
+from ._query_stream import QueryResultStream
+from ._service_interface import (
+    PAGE_SIZE,
+    Call,
+    QueryEndpoint,
+    ServiceInterface,
+    authenticated,
+    coalesced,
+    iter_pages,
+    tables_and_columns_map,
+    tables_in_hive_map,
+)
 
 
 class _Api(object):
@@ -17,6 +28,10 @@ class _Api(object):
     def query(client, endpoint, **kwargs):
         return client.post(endpoint=endpoint, **kwargs).json()
 
+    @staticmethod
+    def query_stream(client, endpoint, **kwargs):
+        return QueryResultStream(client.post(endpoint=endpoint, stream=True, **kwargs).raw)
+
     @staticmethod
     def tables_and_columns(client, endpoint, **kwargs):
         return client.get(endpoint=endpoint, **kwargs).json()
@@ -85,50 +100,91 @@ class _Api(object):
         return client.delete(endpoint=endpoint, **kwargs).json()
 
 
-class KylinService(ServiceInterface):
-    api = _Api
+class KylinEndpoints(QueryEndpoint):
+    """Requests of the read calls of Apache Kylin, shared with `AsyncKylinService`."""
+    api_version = 'v1'
 
-    def __init__(self, client, project=None):
-        self.client = client
-        self.project = project
+    def _projects(self, **kwargs):
+        params = {
+            'pageOffset': 0,
+            'pageSize': 1000,
+        }
+        kwargs.setdefault('params', params)
+        return Call('projects', 'get', '/projects', kwargs)
 
-    def query(self, sql, limit=50000, offset=0, acceptPartial=False, **kwargs):
-        json_data = {
-            'acceptPartial': acceptPartial,
-            'limit': limit,
-            'offset': offset,
+    def _jobs(self, **params):
+        _params = {
+            'projectName': self.project,
+            'limit': 15,
+            'offset': 0,
+        }
+        _params.update(params)
+        return Call('jobs', 'get', '/jobs', {'params': _params})
+
+    def _job_desc(self, job_id):
+        return Call('job_desc', 'get', '/jobs/{}'.format(job_id), error=KylinJobError)
+
+    def _tables_and_columns(self, **kwargs):
+        params = {
             'project': self.project,
-            'sql': sql,
         }
-        kwargs.setdefault('json', json_data)
-        try:
-            response = self.api.query(self.client, '/query', **kwargs)
-        except InternalServerError as err:
-            raise KylinQueryError(err)
+        kwargs.setdefault('params', params)
+        return Call('tables_and_columns', 'get', '/tables_and_columns', kwargs, result=tables_and_columns_map)
 
-        err_message = response.get('exceptionMessage')
-        if err_message:
-            raise KylinQueryError(err_message)
+    def _tables_in_hive(self, **kwargs):
+        params = {
+            'project': self.project,
+            'ext': True,
+        }
+        kwargs.setdefault('params', params)
+        return Call('tables', 'get', '/tables', kwargs, result=tables_in_hive_map)
 
-        return response
+    def _cube_desc(self, name, **kwargs):
+        return Call('cube_desc', 'get', '/cube_desc/{}/desc'.format(name), kwargs)
 
-    def projects(self, **kwargs):
+    def _models(self, **kwargs):
         params = {
+            'projectName': self.project,
             'pageOffset': 0,
             'pageSize': 1000,
         }
         kwargs.setdefault('params', params)
-        _projects = self.api.projects(self.client, '/projects', **kwargs)
-        return _projects
+        return Call('models', 'get', '/models', kwargs)
 
-    def jobs(self, **params):
-        _params = {
-            'projectName': self.project,
-            'limit': 15,
+    def _cubes(self, name=None, **kwargs):
+        params = {
+            'pageOffset': 0,
             'offset': 0,
+            'limit': 50000,
+            'pageSize': 1000,
+            'projectName': self.project,
         }
-        _params.update(params)
-        return self.api.jobs(self.client, '/jobs', params=_params)
+        if name:
+            params.update({'cubeName': name})
+        kwargs.setdefault('params', params)
+        return Call('cubes', 'get', '/cubes', kwargs)
+
+    def _authentication(self, **kwargs):
+        return Call(
+            'authentication', 'get', '/user/authentication', kwargs,
+            result=lambda rv: authenticated(rv).get('userDetails'),
+        )
+
+
+class KylinService(KylinEndpoints, ServiceInterface):
+    api = _Api
+
+    def __init__(self, client, project=None, cache=None):
+        self.client = client
+        self.project = project
+        self.cache = cache
+
+    @coalesced
+    def projects(self, **kwargs):
+        return self._send(self._projects(**kwargs))
+
+    def jobs(self, **params):
+        return self._send(self._jobs(**params))
 
     def maintain_job(self, job_id, maintain_type):
         if maintain_type not in ('resume', 'cancel', 'pause'):
@@ -148,70 +204,71 @@ class KylinService(ServiceInterface):
             raise KylinJobError(e)
 
     def job_desc(self, job_id):
-        try:
-            return self.api.job_desc(self.client, '/jobs/{}'.format(job_id))
-        except InternalServerError as e:
-            raise KylinJobError(e)
+        return self._send(self._job_desc(job_id))
 
+    @coalesced
     def tables_and_columns(self, **kwargs):
-        params = {
-            'project': self.project,
-        }
-        kwargs.setdefault('params', params)
-        resp = self.api.tables_and_columns(self.client, '/tables_and_columns', **kwargs)
-        tbl_pair = tuple(('{}.{}'.format(tbl.get('table_SCHEM'), tbl.get('table_NAME')), tbl) for tbl in resp)
-        for tbl in tbl_pair:
-            tbl[1]['columns'] = [(col['column_NAME'], col) for col in tbl[1]['columns']]
-        return dict(tbl_pair)
+        return self._send(self._tables_and_columns(**kwargs))
 
+    @coalesced
     def tables_in_hive(self, **kwargs):
-        params = {
-            'project': self.project,
-            'ext': True,
-        }
-        kwargs.setdefault('params', params)
-        tables = self.api.tables(self.client, '/tables', **kwargs)
-
-        __tables_in_hive = {}
-        for tbl in tables:
-            db = tbl['database']
-            name = tbl['name']
-            fullname = '{}.{}'.format(db, name)
-            __tables_in_hive[fullname] = tbl
-
-        return __tables_in_hive
+        return self._send(self._tables_in_hive(**kwargs))
 
+    @coalesced
     def cube_desc(self, name, **kwargs):
-        return self.api.cube_desc(self.client, '/cube_desc/{}/desc'.format(name), **kwargs)
+        return self._send(self._cube_desc(name, **kwargs))
 
+    @coalesced
     def model_desc(self, name, **kwargs):
         return [_ for _ in self.models(**kwargs) if _.get('name') == name][0]
 
+    @coalesced
     def models(self, **kwargs):
-        params = {
-            'projectName': self.project,
-            'pageOffset': 0,
-            'pageSize': 1000,
-        }
-        kwargs.setdefault('params', params)
-        return self.api.models(self.client, '/models', **kwargs)
+        return self._send(self._models(**kwargs))
 
+    @coalesced
     def cubes(self, name=None, **kwargs):
-        params = {
-            'pageOffset': 0,
-            'offset': 0,
-            'limit': 50000,
-            'pageSize': 1000,
-            'projectName': self.project,
-        }
-        if name:
-            params.update({'cubeName': name})
-        kwargs.setdefault('params', params)
-        return self.api.cubes(self.client, '/cubes', **kwargs)
+        return self._send(self._cubes(name, **kwargs))
+
+    def iter_projects(self, page_size=PAGE_SIZE, prefetch=1):
+        return iter_pages(
+            lambda page, page_size: self.api.projects(self.client, '/projects', params=self._page(page, page_size)),
+            page_size,
+            prefetch,
+        )
+
+    def iter_jobs(self, page_size=PAGE_SIZE, prefetch=1, **params):
+        def fetch(page, page_size):
+            _params = {'projectName': self.project}
+            _params.update(params)
+            _params.update(self._page(page, page_size))
+            return self.api.jobs(self.client, '/jobs', params=_params)
+        return iter_pages(fetch, page_size, prefetch)
+
+    def iter_tables(self, page_size=PAGE_SIZE, prefetch=1):
+        # not paginated by Apache Kylin
+        return iter(self.api.tables(self.client, '/tables', params={'project': self.project, 'ext': True}))
+
+    def iter_models(self, page_size=PAGE_SIZE, prefetch=1):
+        def fetch(page, page_size):
+            params = {'projectName': self.project}
+            params.update(self._page(page, page_size))
+            return self.api.models(self.client, '/models', params=params)
+        return iter_pages(fetch, page_size, prefetch)
+
+    def iter_cubes(self, page_size=PAGE_SIZE, prefetch=1):
+        def fetch(page, page_size):
+            params = {'projectName': self.project}
+            params.update(self._page(page, page_size))
+            return self.api.cubes(self.client, '/cubes', params=params)
+        return iter_pages(fetch, page_size, prefetch)
+
+    @staticmethod
+    def _page(page, page_size):
+        return {'offset': page * page_size, 'limit': page_size}
 
     def get_authentication(self, **kwargs):
-        rv = self.api.authentication(self.client, '/user/authentication', **kwargs)
-        return rv.get('userDetails')
+        return self._send(self._authentication(**kwargs))
 
     def fullbuild(self, cube_name):
         json = {
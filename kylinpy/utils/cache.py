@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import contextlib
+import threading
+import time
+from collections import OrderedDict
+
+from kylinpy.logger import logger
+
+# metadata endpoints cached by default, the others (projects, cubes) carry
+# build status and segments that go stale too quickly
+CACHED_ENDPOINTS = ('tables_and_columns', 'tables_in_hive', 'models', 'model', 'model_desc', 'cube_desc')
+
+# states of `MetadataCache.lookup()`: a value to serve, a stale one this caller
+# refreshes, a stale one refreshed elsewhere, or none
+HIT = 'hit'
+REFRESH = 'refresh'
+STALE = 'stale'
+MISS = 'miss'
+
+
+class _Entry(object):
+    __slots__ = ('name', 'args', 'value', 'stored_at')
+
+    def __init__(self, name, args, value, stored_at):
+        self.name = name
+        self.args = args
+        self.value = value
+        self.stored_at = stored_at
+
+
+class MetadataCache(object):
+    """
+    LRU cache of metadata responses with per-endpoint TTLs.
+
+    A value younger than its endpoint's TTL is served as is. For
+    `stale_ttl` seconds after that it is still served, while a background
+    thread fetches a fresh one; older values are fetched again in the
+    caller's thread. Cached values are shared by every caller, treat them
+    as read-only.
+
+    With a `MetadataSnapshot` as `store`, values are written through to
+    it and misses are looked up in it. Values from the store up to
+    `max_snapshot_age` seconds old are served, and revalidated in the
+    background once past their TTL.
+
+    :param ttl: seconds a value stays fresh, for the endpoints in `CACHED_ENDPOINTS`
+    :param ttls: dict of endpoint name to TTL overriding `ttl`, 0 disables caching an endpoint
+    :param namespace: the store rows `invalidate()` drops, e.g. the cluster and project
+    """
+
+    def __init__(self, ttl=300, stale_ttl=600, maxsize=256, ttls=None,
+                 store=None, namespace=None, max_snapshot_age=86400):
+        self.ttls = dict((name, ttl) for name in CACHED_ENDPOINTS)
+        self.ttls.update(ttls or {})
+        self.stale_ttl = stale_ttl
+        self.maxsize = maxsize
+        self.store = store
+        self.namespace = namespace
+        self.max_snapshot_age = max_snapshot_age
+        self.hits = 0
+        self.snapshot_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        # bumped by invalidate() for everything, an endpoint or a call, so
+        # that fetches started before it are not stored
+        self._generation = 0
+        self._name_generations = {}
+        self._call_generations = {}
+        self._bypass = threading.local()
+        self._lock = threading.Lock()
+        # orders the store writes of put() and invalidate(), taken before `_lock`
+        self._store_lock = threading.Lock()
+
+    def ttl(self, name):
+        return self.ttls.get(name, 0)
+
+    def get(self, key, name, fetch, args=()):
+        """
+        :param args: the positional arguments of the call, for `invalidate()`
+        :return: the cached value of `key`, or `fetch()`'s result, stored under `key`
+        """
+        if self.ttl(name) <= 0:
+            return fetch()
+
+        state, value, generation = self.lookup(key, name, args)
+        if state == MISS:
+            value = fetch()
+            self.put(key, name, args, value, generation)
+        elif state == REFRESH:
+            thread = threading.Thread(target=self._refresh, args=(key, name, args, fetch, generation))
+            thread.daemon = True
+            thread.start()
+        return value
+
+    def lookup(self, key, name, args=()):
+        """
+        The steps of `get()` for callers fetching on their own, e.g. coroutines.
+        A caller getting `MISS` fetches and `put()`s the value, one getting
+        `REFRESH` does so later and calls `refreshed()` in any case.
+
+        :return: tuple of (state, cached value or None, generation to `put()` with)
+        """
+        ttl = self.ttl(name)
+        with self._lock:
+            generation = self._generation_of(name, args)
+            if getattr(self._bypass, 'active', False):
+                return MISS, None, generation
+            entry = self._entries.get(key)
+        if entry is None and self.store is not None:
+            entry = self._load(key, name, args, ttl, generation)
+
+        now = time.time()
+        with self._lock:
+            age = now - entry.stored_at if entry is not None else None
+            if age is not None and age < ttl:
+                if key in self._entries:
+                    self._entries[key] = self._entries.pop(key)
+                self.hits += 1
+                return HIT, entry.value, generation
+            if age is not None and age < ttl + self.stale_ttl:
+                self.stale_hits += 1
+                if key in self._refreshing:
+                    return STALE, entry.value, generation
+                self._refreshing.add(key)
+                return REFRESH, entry.value, generation
+            self.misses += 1
+            return MISS, None, generation
+
+    def _load(self, key, name, args, ttl, generation):
+        record = self.store.load(key)
+        if record is None:
+            return None
+        value, stored_at = record
+        now = time.time()
+        if now - stored_at > self.max_snapshot_age:
+            return None
+        # an old snapshot value is served from now on for stale_ttl, while it is revalidated
+        entry = _Entry(name, args, value, max(stored_at, now - ttl))
+        with self._lock:
+            if generation != self._generation_of(name, args):
+                return None
+            self.snapshot_hits += 1
+            self._insert(key, entry)
+        return entry
+
+    def _generation_of(self, name, args):
+        call = (name, tuple(args))
+        return self._generation, self._name_generations.get(name, 0), self._call_generations.get(call, 0)
+
+    @contextlib.contextmanager
+    def bypass(self):
+        """
+        Within the block, calls of this thread skip the cached values: they
+        fetch, and store, fresh ones. Unlike `invalidate()` it leaves the
+        values other callers are served and fetching alone.
+        """
+        self._bypass.active = True
+        try:
+            yield
+        finally:
+            self._bypass.active = False
+
+    def _refresh(self, key, name, args, fetch, generation):
+        try:
+            self.put(key, name, args, fetch(), generation)
+        except Exception as err:
+            logger.warning('Refreshing {} failed, serving the stale value: {!r}'.format(name, err))
+        finally:
+            self.refreshed(key)
+
+    def refreshed(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def put(self, key, name, args, value, generation):
+        """Store `value`, unless `invalidate()` was called since `generation` was looked up."""
+        entry = _Entry(name, args, value, time.time())
+        # an invalidate() racing this one waits for the save, then deletes the row
+        with self._store_lock:
+            with self._lock:
+                if generation != self._generation_of(name, args):
+                    return
+                self._insert(key, entry)
+            if self.store is not None:
+                self.store.save(key, self.namespace, name, value, entry.stored_at, args)
+
+    def _insert(self, key, entry):
+        self._entries.pop(key, None)
+        self._entries[key] = entry
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, name=None, args=None):
+        """
+        Drop the cached values of endpoint `name`, or all of them. With
+        `args` only the value of the call with these positional arguments
+        is dropped.
+        """
+        with self._store_lock:
+            with self._lock:
+                if name is None:
+                    self._generation += 1
+                    self._entries.clear()
+                else:
+                    if args is None:
+                        self._name_generations[name] = self._name_generations.get(name, 0) + 1
+                    else:
+                        call = (name, tuple(args))
+                        self._call_generations[call] = self._call_generations.get(call, 0) + 1
+                    for key in [
+                        key for (key, entry) in self._entries.items()
+                        if entry.name == name and (args is None or entry.args == tuple(args))
+                    ]:
+                        del self._entries[key]
+            if self.store is not None:
+                self.store.delete(self.namespace, name, args)
+
+    def __len__(self):
+        return len(self._entries)
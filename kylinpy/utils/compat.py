@@ -15,14 +15,20 @@ try:
     from urllib.parse import urlencode  # noqa
     from urllib.parse import parse_qsl, quote_plus  # noqa
     from urllib.error import HTTPError  # noqa
+    from urllib.error import URLError  # noqa
+    import http.client as http_client  # noqa
+    from http.cookiejar import CookieJar  # noqa
 except ImportError:
     # Python 2
     import urllib2 as urllib  # noqa
     from urlparse import urlparse  # noqa
     from urlparse import parse_qsl  # noqa
     from urllib2 import HTTPError  # noqa
+    from urllib2 import URLError  # noqa
+    import httplib as http_client  # noqa
     from urllib2 import HTTPSHandler  # noqa
     from urllib import urlencode, quote_plus  # noqa
+    from cookielib import CookieJar  # noqa
 
 PY3 = sys.version_info[0] == 3
 
@@ -5,6 +5,7 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 from kylinpy.logger import logger
+from kylinpy.utils.compat import string_types
 
 
 def private_v4_api_warnings(fn):
@@ -12,3 +13,10 @@ def private_v4_api_warnings(fn):
         logger.warning('Use internal v4-API call, this API-CALL is not in KE4 official manual')
         return fn(*args, **kwargs)
     return wrapper
+
+
+def as_bool(value):
+    # values from a DSN query string arrive as strings, so '0' must be falsy
+    if isinstance(value, string_types):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
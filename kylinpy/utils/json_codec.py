@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class StdlibCodec(object):
+    name = 'json'
+
+    @staticmethod
+    def loads(data):
+        return json.loads(data)
+
+    @staticmethod
+    def dumps(obj):
+        return json.dumps(obj).encode('utf-8')
+
+
+class OrjsonCodec(object):
+    name = 'orjson'
+
+    @staticmethod
+    def loads(data):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson rejects a few documents the stdlib accepts, such as integers beyond 64 bits
+            return StdlibCodec.loads(data)
+
+    @staticmethod
+    def dumps(obj):
+        return orjson.dumps(obj)
+
+
+class UjsonCodec(object):
+    name = 'ujson'
+
+    @staticmethod
+    def loads(data):
+        return ujson.loads(data)
+
+    @staticmethod
+    def dumps(obj):
+        return ujson.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+CODECS = {
+    'json': StdlibCodec,
+    'orjson': OrjsonCodec,
+    'ujson': UjsonCodec,
+}
+
+_MODULES = {
+    'json': json,
+    'orjson': orjson,
+    'ujson': ujson,
+}
+
+
+# ujson is no faster than the stdlib on string-heavy query results (see
+# benchmarks/bench_json_codec.py), so 'auto' only upgrades to orjson
+AUTO_CODECS = ('orjson', 'json')
+
+
+def available_codecs():
+    return [name for name in ('orjson', 'ujson', 'json') if _MODULES[name] is not None]
+
+
+def get_codec(name=None):
+    """
+    :param name: 'orjson', 'ujson', 'json', or 'auto'/None for the fastest one installed
+    :return: codec with `loads(bytes)` and `dumps(obj) -> bytes`
+    """
+    if name is None or name == 'auto':
+        return CODECS[[name for name in AUTO_CODECS if _MODULES[name] is not None][0]]
+    if name not in CODECS:
+        raise ValueError('Unknown JSON codec: {}, expected one of {}'.format(name, sorted(CODECS)))
+    if _MODULES[name] is None:
+        raise ValueError('JSON codec {} is not installed'.format(name))
+    return CODECS[name]
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import codecs
+import json
+
+CHUNK_SIZE = 64 * 1024
+_WHITESPACE = ' \t\n\r'
+_DELIMITERS = _WHITESPACE + ',]}:'
+
+
+class JSONStreamReader(object):
+    """
+    Pull parser over a file-like object of JSON bytes.
+
+    Only the current chunk and the value being decoded are buffered, so
+    large arrays can be consumed element by element with `iter_array()`.
+    """
+
+    def __init__(self, fp, chunk_size=CHUNK_SIZE):
+        self._fp = fp
+        self._chunk_size = chunk_size
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json_decoder = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        if self._eof:
+            return False
+        data = self._fp.read(self._chunk_size)
+        if data:
+            text = self._text_decoder.decode(data)
+        else:
+            self._eof = True
+            text = self._text_decoder.decode(b'', True)
+        self._buf = self._buf[self._pos:] + text
+        self._pos = 0
+        return bool(data)
+
+    def peek(self):
+        """
+        :return: next non-whitespace character, or '' at the end of input
+        """
+        while True:
+            buf, pos = self._buf, self._pos
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self._fill() and self._pos >= len(self._buf):
+                return ''
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError('Expecting {!r}, got {!r}'.format(char, found or 'end of input'))
+        self._pos += 1
+
+    def read_value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(self._buf, self._pos)
+            except ValueError:
+                if self._fill():
+                    continue
+                raise
+            if (
+                self._buf[self._pos] not in '{["'
+                and (end == len(self._buf) or self._buf[end] not in _DELIMITERS)
+                and self._fill()
+            ):
+                # a number or literal may continue in the next chunk, such as '1' of '1.5'
+                continue
+            self._pos = end
+            return value
+
+    def iter_object(self):
+        """
+        Yield the keys of an object. The caller must consume each value
+        (`read_value`, `iter_array` or `iter_object`) before asking for the next key.
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self.read_value()
+            self.expect(':')
+            yield key
+            found = self.peek()
+            self._pos += 1
+            if found == '}':
+                return
+            if found != ',':
+                raise ValueError("Expecting ',' or '}}', got {!r}".format(found or 'end of input'))
+
+    def iter_array(self):
+        self.expect('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self.read_value()
+            found = self.peek()
+            self._pos += 1
+            if found == ']':
+                return
+            if found != ',':
+                raise ValueError("Expecting ',' or ']', got {!r}".format(found or 'end of input'))
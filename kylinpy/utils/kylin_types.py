@@ -43,10 +43,41 @@ def _convert_type(_type):
     return str(_type).upper()
 
 
+def _identity(s):
+    return s
+
+
+def converter(_type):
+    """
+    :return: callable converting a raw cell of a column of `_type` to python,
+        with the type resolved once, empty cells are returned as they are
+    """
+    convert = KylinType.get(_convert_type(_type))
+    if convert is None:
+        def unsupported(s):
+            if s:
+                logger.error('CONVERT ERROR, type: {}, raw string: {}'.format(_type, s))
+                raise KylinUnsupportedType(_type)
+            return s
+        return unsupported
+    if convert is text_type:
+        # JSON strings are text already
+        return _identity
+
+    def convert_cell(s):
+        return convert(s) if s else s
+    return convert_cell
+
+
+def row_converter(types):
+    """
+    :return: callable converting a raw row of columns of `types` to a tuple, in one pass
+    """
+    converters = [converter(_type) for _type in types]
+    if all(convert is _identity for convert in converters):
+        return tuple
+    return lambda row: tuple([convert(cell) for (convert, cell) in zip(converters, row)])
+
+
 def kylin_to_python(_type, s):
-    try:
-        return KylinType[_convert_type(_type)](s) if s else s
-    except KeyError:
-        logger.error(
-            'CONVERT ERROR, type: {}, raw string: {}'.format(_type, s))
-        raise KylinUnsupportedType(_type)
+    return converter(_type)(s)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import copy
+import threading
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.followers = 0
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Run one call per key at a time: callers arriving while a call with
+    the same key is in flight wait for it and get a deep copy of its
+    result, or its exception.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.num_calls = 0
+        self.num_coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.num_calls += 1
+            else:
+                call.followers += 1
+                self.num_coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            result = fn()
+        except BaseException as err:
+            call.error = err
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+            raise
+
+        with self._lock:
+            del self._calls[key]
+            followers = call.followers
+        if followers:
+            # the leader may mutate its result, so followers copy a snapshot
+            call.result = copy.deepcopy(result)
+        call.done.set()
+        return result
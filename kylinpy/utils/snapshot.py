@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import contextlib
+import hashlib
+import json
+import pickle
+import sqlite3
+
+from kylinpy.logger import logger
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (
+    key TEXT PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value BLOB NOT NULL,
+    stored_at REAL NOT NULL,
+    args TEXT
+)
+"""
+
+
+class MetadataSnapshot(object):
+    """
+    `MetadataCache` entries kept in a SQLite file, so that new processes
+    on the same machine start from the metadata an earlier one fetched.
+
+    Keys are stored hashed, they contain the request headers. Values are
+    pickled, only point `path` at a file the application alone can write.
+    Errors are logged and treated as a missing snapshot.
+    """
+
+    def __init__(self, path, timeout=5):
+        self.path = path
+        self.timeout = timeout
+        try:
+            with self._connect() as conn:
+                # readers of other processes do not block the writer
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute(_SCHEMA)
+                # snapshots written before rows were deleted by their call arguments
+                if 'args' not in [row[1] for row in conn.execute('PRAGMA table_info(metadata)')]:
+                    conn.execute('ALTER TABLE metadata ADD COLUMN args TEXT')
+        except sqlite3.Error as err:
+            logger.warning('Metadata snapshot {} is not usable: {!r}'.format(path, err))
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # one connection per call, they must not cross threads or forked workers
+        conn = sqlite3.connect(self.path, timeout=self.timeout)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _digest(key):
+        return hashlib.sha256(json.dumps(key, default=repr).encode('utf-8')).hexdigest()
+
+    def load(self, key):
+        """
+        :return: tuple of (value, stored_at), or None
+        """
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    'SELECT value, stored_at FROM metadata WHERE key = ?', (self._digest(key),)).fetchone()
+            if row is None:
+                return None
+            return pickle.loads(bytes(row[0])), row[1]
+        except Exception as err:
+            logger.warning('Reading the metadata snapshot {} failed: {!r}'.format(self.path, err))
+            return None
+
+    def save(self, key, namespace, name, value, stored_at, args=()):
+        """
+        :param args: the positional arguments of the call, for `delete()`
+        """
+        try:
+            data = sqlite3.Binary(pickle.dumps(value, protocol=2))
+            with self._connect() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO metadata (key, namespace, name, value, stored_at, args) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (self._digest(key), namespace or '', name, data, stored_at, self._digest(tuple(args))),
+                )
+        except Exception as err:
+            logger.warning('Writing the metadata snapshot {} failed: {!r}'.format(self.path, err))
+
+    def delete(self, namespace, name=None, args=None):
+        """
+        Delete the rows of endpoint `name`, or all of them, with `args` only
+        the row of the call with these positional arguments.
+        """
+        try:
+            with self._connect() as conn:
+                if name is None:
+                    conn.execute('DELETE FROM metadata WHERE namespace = ?', (namespace or '',))
+                elif args is None:
+                    conn.execute(
+                        'DELETE FROM metadata WHERE namespace = ? AND name = ?', (namespace or '', name))
+                else:
+                    conn.execute(
+                        'DELETE FROM metadata WHERE namespace = ? AND name = ? AND args = ?',
+                        (namespace or '', name, self._digest(tuple(args))),
+                    )
+        except sqlite3.Error as err:
+            logger.warning('Deleting from the metadata snapshot {} failed: {!r}'.format(self.path, err))
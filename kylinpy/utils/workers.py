@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import threading
+
+
+def map_concurrently(fn, items, max_workers=4, name='kylinpy-worker'):
+    """
+    Call `fn` on each item on at most `max_workers` threads.
+
+    :return: list of the results, in the order of `items`
+    :raises: the exception of the first failed item, once all items are done
+    """
+    items = list(items)
+    results = [None] * len(items)
+    errors = [None] * len(items)
+    if not items:
+        return results
+
+    pending = iter(range(len(items)))
+    lock = threading.Lock()
+
+    def work():
+        while True:
+            with lock:
+                index = next(pending, None)
+            if index is None:
+                return
+            try:
+                results[index] = fn(items[index])
+            except Exception as err:
+                errors[index] = err
+
+    threads = [
+        threading.Thread(target=work, name='{}-{}'.format(name, i))
+        for i in range(min(max(1, max_workers), len(items)))
+    ]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for error in errors:
+        if error is not None:
+            raise error
+    return results
+
+
+class Future(object):
+    """`fn(*args)` running on its own daemon thread."""
+
+    def __init__(self, fn, *args):
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+        thread = threading.Thread(target=self._run, args=(fn, args), name='kylinpy-future')
+        thread.daemon = True
+        thread.start()
+
+    def _run(self, fn, args):
+        try:
+            self._result = fn(*args)
+        except Exception as err:
+            self._error = err
+        finally:
+            self._done.set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self):
+        """
+        :return: the result of `fn`, once it returned
+        :raises: the exception `fn` raised
+        """
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class ConcurrentMap(object):
+    """
+    Iterator of `fn(item)` for each item, in the order of `items`, computed
+    ahead on a pool of `max_workers` threads. Items are taken as results are
+    consumed, at most `max_workers` results are running or waiting to be
+    consumed at once. `close()` stops the pool from taking more items.
+    """
+
+    def __init__(self, fn, items, max_workers=4, name='kylinpy-worker'):
+        self._fn = fn
+        self._items = iter(items)
+        self._results = {}
+        self._taken = 0
+        self._index = 0
+        self._exhausted = False
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._room = threading.Semaphore(max(1, max_workers))
+        self._threads = [
+            threading.Thread(target=self._work, name='{}-{}'.format(name, i))
+            for i in range(max(1, max_workers))
+        ]
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def _take(self):
+        with self._cond:
+            if self._stopped or self._exhausted:
+                return None
+            try:
+                item = next(self._items)
+            except StopIteration:
+                self._exhausted = True
+                self._cond.notify_all()
+                return None
+            except BaseException as err:
+                # the items failed, the consumer gets the error in place of the next result
+                self._exhausted = True
+                self._results[self._taken] = (None, err)
+                self._taken += 1
+                self._cond.notify_all()
+                return None
+            self._taken += 1
+            return self._taken - 1, item
+
+    def _work(self):
+        while True:
+            self._room.acquire()
+            taken = self._take()
+            if taken is None:
+                self._room.release()
+                return
+            index, item = taken
+            try:
+                result = (self._fn(item), None)
+            except BaseException as err:
+                # whatever `fn` raised, the consumer waiting for this result gets it
+                result = (None, err)
+            with self._cond:
+                self._results[index] = result
+                self._cond.notify_all()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """
+        :return: the next result
+        :raises: the exception `fn` raised for the next item
+        """
+        with self._cond:
+            while self._index not in self._results:
+                if self._stopped or (self._exhausted and self._index >= self._taken):
+                    raise StopIteration
+                self._cond.wait()
+            result, error = self._results.pop(self._index)
+            self._index += 1
+        self._room.release()
+        if error is not None:
+            raise error
+        return result
+
+    next = __next__
+
+    def close(self):
+        with self._cond:
+            self._stopped = True
+            self._results.clear()
+            self._cond.notify_all()
+        for _ in self._threads:
+            self._room.release()
@@ -42,6 +42,8 @@ setup(
     install_requires=[],
     extras_require={
         'sqlalchemy': ['sqlalchemy>=1.1.0'],
+        'orjson': ['orjson'],
+        'ujson': ['ujson'],
     },
     keywords=['apache kylin', 'kylin', 'kap', 'kyligence',
               'kyligence enterprise', 'cli', 'sqlalchemy dialect'],
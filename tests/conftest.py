@@ -6,8 +6,12 @@ from __future__ import unicode_literals
 
 from sqlalchemy.dialects import registry
 
+from kylinpy.utils.compat import PY3
+
 registry.register('kylin', 'kylinpy.sqla_dialect', 'KylinDialect')
 
+collect_ignore = [] if PY3 else ['test_async_kylin.py']
+
 pytest_plugins = [
     'tests.fixtures.api',
 ]
@@ -9,12 +9,22 @@ import json
 
 import pytest
 
+from kylinpy.service._query_stream import QueryResultStream
+
 
 def read(version, filename):
     here = os.path.abspath(os.path.dirname(__file__))
     return json.load(open(os.path.join(here, version, filename)))
 
 
+def read_stream(version, filename, path=()):
+    here = os.path.abspath(os.path.dirname(__file__))
+
+    def _stream(*args, **kwargs):
+        return QueryResultStream(open(os.path.join(here, version, filename), 'rb'), path=path, chunk_size=64)
+    return _stream
+
+
 @pytest.fixture
 def v1_api(mocker):
     cube_desc = read('v1', 'cube_desc.json')
@@ -33,6 +43,7 @@ def v1_api(mocker):
     mocker.patch('kylinpy.service.KylinService.api.projects', return_value=projects)
     mocker.patch('kylinpy.service.KylinService.api.jobs', return_value=jobs)
     mocker.patch('kylinpy.service.KylinService.api.query', return_value=query)
+    mocker.patch('kylinpy.service.KylinService.api.query_stream', side_effect=read_stream('v1', 'query.json'))
     mocker.patch('kylinpy.service.KylinService.api.tables', return_value=tables)
     mocker.patch('kylinpy.service.KylinService.api.tables_and_columns', return_value=tables_and_columns)
     mocker.patch('kylinpy.service.KylinService.api.authentication', return_value=authentication)
@@ -65,6 +76,10 @@ def v2_api(mocker):
     mocker.patch('kylinpy.service.KE3Service.api.projects', return_value=projects)
     mocker.patch('kylinpy.service.KE3Service.api.jobs', return_value=jobs)
     mocker.patch('kylinpy.service.KE3Service.api.query', return_value=query)
+    mocker.patch(
+        'kylinpy.service.KE3Service.api.query_stream',
+        side_effect=read_stream('v2', 'query.json', path=('data',)),
+    )
     mocker.patch('kylinpy.service.KE3Service.api.tables', return_value=tables)
     mocker.patch('kylinpy.service.KE3Service.api.tables_and_columns', return_value=tables_and_columns)
     mocker.patch('kylinpy.service.KE3Service.api.authentication', return_value=authentication)
@@ -86,6 +101,10 @@ def v4_api(mocker):
     mocker.patch('kylinpy.service.KE4Service.api.projects', return_value=projects)
     mocker.patch('kylinpy.service.KE4Service.api.jobs', return_value=jobs)
     mocker.patch('kylinpy.service.KE4Service.api.query', return_value=query)
+    mocker.patch(
+        'kylinpy.service.KE4Service.api.query_stream',
+        side_effect=read_stream('v4', 'query.json', path=('data',)),
+    )
     mocker.patch('kylinpy.service.KE4Service.api.tables', return_value=tables)
     mocker.patch('kylinpy.service.KE4Service.api.tables_and_columns', return_value=tables_and_columns)
     mocker.patch('kylinpy.service.KE4Service.api.authentication', return_value=authentication)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import gzip
+import io
+import json
+import zlib
+
+from kylinpy.client import Client
+from kylinpy.client.compression import DecodedStream, TransferStats
+
+
+BODY = json.dumps({'results': [['foo', '1']] * 2000}).encode('utf-8')
+
+
+def gzip_compress(data):
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as f:
+        f.write(data)
+    return buf.getvalue()
+
+
+def raw_deflate_compress(data):
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class MockResponse(object):
+    url = '/query'
+
+    def __init__(self, body, encoding=None):
+        self._fp = io.BytesIO(body)
+        self._headers = {'Content-Encoding': encoding} if encoding else {}
+
+    def getcode(self):
+        return 200
+
+    def info(self):
+        return self._headers
+
+    def read(self, amt=None):
+        return self._fp.read(amt)
+
+
+def test_gzip():
+    stats = TransferStats()
+    compressed = gzip_compress(BODY)
+    stream = DecodedStream(io.BytesIO(compressed), 'gzip', stats, chunk_size=100)
+    assert stream.read() == BODY
+    assert stats.compressed_bytes == len(compressed)
+    assert stats.uncompressed_bytes == len(BODY)
+    assert stats.compressed_responses == 1
+    assert stats.ratio > 1
+
+
+def test_gzip_multiple_members():
+    compressed = gzip_compress(BODY[:100]) + gzip_compress(BODY[100:])
+    assert DecodedStream(io.BytesIO(compressed), 'gzip').read() == BODY
+
+
+def test_deflate():
+    assert DecodedStream(io.BytesIO(zlib.compress(BODY)), 'deflate').read() == BODY
+    assert DecodedStream(io.BytesIO(raw_deflate_compress(BODY)), 'deflate').read() == BODY
+
+
+def test_read_in_chunks():
+    stream = DecodedStream(io.BytesIO(gzip_compress(BODY)), 'gzip', chunk_size=10)
+    chunks = []
+    while True:
+        chunk = stream.read(1000)
+        if not chunk:
+            break
+        assert len(chunk) <= 1000
+        chunks.append(chunk)
+    assert b''.join(chunks) == BODY
+
+
+def test_identity():
+    stats = TransferStats()
+    assert DecodedStream(io.BytesIO(BODY), None, stats).read() == BODY
+    assert stats.compressed_bytes == stats.uncompressed_bytes == len(BODY)
+    assert stats.compressed_responses == 0
+    assert stats.responses == 1
+
+
+def test_client(mocker):
+    client = Client(host='http://example')
+    make_request = mocker.patch(
+        'kylinpy.client.client.Client._make_request',
+        return_value=MockResponse(gzip_compress(BODY), 'gzip'),
+    )
+    assert client.get('/query').json() == json.loads(BODY.decode('utf-8'))
+    request = make_request.call_args[0][1]
+    assert request.get_header('Accept-encoding') == 'gzip, deflate'
+    assert client.stats.compressed_responses == 1
+    assert client.stats.uncompressed_bytes == len(BODY)
+
+    client = Client(host='http://example', compression=False)
+    make_request = mocker.patch(
+        'kylinpy.client.client.Client._make_request',
+        return_value=MockResponse(BODY),
+    )
+    assert client.get('/query').json() == json.loads(BODY.decode('utf-8'))
+    request = make_request.call_args[0][1]
+    assert request.get_header('Accept-encoding') is None
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import json
+
+import pytest
+
+from kylinpy.exceptions import KylinQueryError
+from kylinpy.service._query_stream import QueryResultStream
+from kylinpy.utils.json_stream import JSONStreamReader
+
+
+def to_fp(obj):
+    return io.BytesIO(json.dumps(obj, ensure_ascii=False).encode('utf-8'))
+
+
+class ReadCounter(io.BytesIO):
+    def __init__(self, *args, **kwargs):
+        super(ReadCounter, self).__init__(*args, **kwargs)
+        self.reads = 0
+
+    def read(self, *args):
+        self.reads += 1
+        return super(ReadCounter, self).read(*args)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 1024])
+def test_reader(chunk_size):
+    obj = {'a': 12345, 'b': [1.5, None, True, '中文'], 'c': {}, 'd': [], 'e': 'x'}
+    reader = JSONStreamReader(to_fp(obj), chunk_size=chunk_size)
+    rv = {}
+    for key in reader.iter_object():
+        if key == 'b':
+            rv[key] = list(reader.iter_array())
+        else:
+            rv[key] = reader.read_value()
+    assert rv == obj
+    assert reader.peek() == ''
+
+
+def test_reader_error():
+    reader = JSONStreamReader(io.BytesIO(b'{"a": 1'), chunk_size=2)
+    with pytest.raises(ValueError):
+        [reader.read_value() for _ in reader.iter_object()]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1024])
+def test_query_stream(chunk_size):
+    response = {
+        'code': '000',
+        'data': {
+            'columnMetas': [{'label': 'A'}],
+            'results': [['1'], ['2'], [None]],
+            'exceptionMessage': None,
+            'duration': 10,
+        },
+        'msg': '',
+    }
+    stream = QueryResultStream(to_fp(response), path=('data',), chunk_size=chunk_size)
+    assert stream.column_metas == [{'label': 'A'}]
+    assert list(stream) == [['1'], ['2'], [None]]
+    assert stream.meta['duration'] == 10
+    assert stream.envelope == {'code': '000', 'msg': ''}
+
+
+def test_query_stream_reads_lazily():
+    response = {'columnMetas': [], 'results': [[str(i)] for i in range(10000)]}
+    fp = ReadCounter(json.dumps(response).encode('utf-8'))
+    stream = QueryResultStream(fp, chunk_size=1024)
+    rows = iter(stream)
+    assert next(rows) == ['0']
+    assert fp.reads == 1
+    stream.close()
+    assert fp.closed
+
+
+def test_query_stream_results_first():
+    stream = QueryResultStream(to_fp({'results': [['1']], 'columnMetas': [{'label': 'A'}]}))
+    assert stream.column_metas == [{'label': 'A'}]
+    assert list(stream) == [['1']]
+
+
+def test_query_stream_error():
+    stream = QueryResultStream(to_fp({'columnMetas': None, 'results': None, 'exceptionMessage': 'foobar'}))
+    with pytest.raises(KylinQueryError):
+        stream.column_metas
+
+    stream = QueryResultStream(to_fp({'columnMetas': [{}], 'results': [], 'exceptionMessage': 'foobar'}))
+    with pytest.raises(KylinQueryError):
+        list(stream)
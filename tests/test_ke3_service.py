@@ -57,6 +57,17 @@ class TestKE3Service(object):
         rv = self.project.service.models(headers={})
         assert [e['name'] for e in rv] == ['kylin_sales_model']
 
+    def test_iter_cubes(self, v2_api, mocker):
+        cubes = [{'name': 'cube_{}'.format(i)} for i in range(5)]
+
+        def _cubes(client, endpoint, params):
+            start = params['pageOffset'] * params['pageSize']
+            return {'cubes': cubes[start:start + params['pageSize']], 'size': len(cubes)}
+        api = mocker.patch('kylinpy.service.KE3Service.api.cubes', side_effect=_cubes)
+        rv = list(self.project.service.iter_cubes(page_size=2, prefetch=0))
+        assert [e['name'] for e in rv] == [e['name'] for e in cubes]
+        assert api.call_count == 3
+
     def test_cube_desc(self, v2_api):
         rv = self.project.service.cube_desc('kylin_sales_cube', headers={})
         assert 'dimensions' in rv
@@ -76,6 +87,14 @@ class TestKE3Service(object):
         assert 'columnMetas' in rv
         assert 'results' in rv
 
+    def test_query_stream(self, v2_api):
+        rv = self.project.service.query(sql='select count(*) from kylin_sales', stream=True)
+        assert rv.column_metas[0]['columnTypeName']
+        rows = list(rv)
+        assert rows == self.project.service.query(sql='select count(*) from kylin_sales')['results']
+        assert 'results' not in rv.meta
+        assert rv.meta['columnMetas'] == rv.column_metas
+
     def test_error_query(self, mocker):
         mocker.patch('kylinpy.service.KE3Service.api.query', return_value={'exceptionMessage': 'foobar'})
 
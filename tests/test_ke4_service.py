@@ -9,6 +9,7 @@ import pytest
 from kylinpy.client import HTTPError
 from kylinpy.kylinpy import create_kylin
 from kylinpy.exceptions import KylinQueryError
+from .fixtures.api import read
 from .test_client import MockException
 
 
@@ -50,11 +51,29 @@ class TestKE4Service(object):
             'SSB.SUPPLIER',
         ]
 
+    def test_iter_tables(self, v4_api, mocker):
+        tables = read('v4', 'tables.json').get('data').get('value')
+
+        def _tables(client, endpoint, params):
+            start = params['page_offset'] * params['page_size']
+            return {'value': tables[start:start + params['page_size']]}
+        mocker.patch('kylinpy.service.KE4Service.api.tables', side_effect=_tables)
+        rv = self.project.service.iter_tables(page_size=2, prefetch=2)
+        assert [e['name'] for e in rv] == [e['name'] for e in tables]
+
     def test_query(self, v4_api):
         rv = self.project.service.query(sql='select count(*) from P_LINEORDER', headers={})
         assert 'columnMetas' in rv
         assert 'results' in rv
 
+    def test_query_stream(self, v4_api):
+        rv = self.project.service.query(sql='select count(*) from kylin_sales', stream=True)
+        assert rv.column_metas[0]['columnTypeName']
+        rows = list(rv)
+        assert rows == self.project.service.query(sql='select count(*) from kylin_sales')['results']
+        assert 'results' not in rv.meta
+        assert rv.meta['columnMetas'] == rv.column_metas
+
     def test_error_query(self, mocker):
         mocker.patch('kylinpy.service.KE4Service.api.query', return_value={'exceptionMessage': 'foobar'})
 
@@ -9,6 +9,7 @@ import pytest
 from kylinpy.client import HTTPError
 from kylinpy.kylinpy import create_kylin
 from kylinpy.exceptions import KylinQueryError
+from kylinpy.service._service_interface import iter_pages
 from .test_client import MockException
 
 
@@ -58,6 +59,58 @@ class TestKylinService(object):
         rv = self.project.service.models(headers={})
         assert [e['name'] for e in rv] == ['kylin_sales_model', 'kylin_streaming_model']
 
+    def test_iter_models(self, mocker):
+        models = [{'name': 'model_{}'.format(i)} for i in range(7)]
+        api = mocker.patch(
+            'kylinpy.service.KylinService.api.models',
+            side_effect=lambda client, endpoint, params: models[params['offset']:params['offset'] + params['limit']],
+        )
+        rv = self.project.service.iter_models(page_size=3)
+        assert next(rv) == {'name': 'model_0'}
+        assert [e['name'] for e in rv] == ['model_{}'.format(i) for i in range(1, 7)]
+        assert api.call_args_list[0][1]['params'] == {'projectName': 'learn_kylin', 'offset': 0, 'limit': 3}
+        # the last page is short, the one prefetched after it is dropped
+        assert api.call_count == 4
+
+    def test_iter_ignored_paging(self, v1_api):
+        # the fixture answers the same two models whatever the page
+        rv = self.project.service.iter_models(page_size=2)
+        assert [e['name'] for e in rv] == ['kylin_sales_model', 'kylin_streaming_model']
+
+        pages = iter_pages(lambda page, page_size: [page], page_size=1, max_pages=5)
+        assert list(pages) == [0, 1, 2, 3, 4]
+
+    def test_iter_changing_list(self):
+        models = [{'uuid': str(i)} for i in range(6)]
+
+        def fetch(page, page_size):
+            if page == 1:
+                # a model created while listing pushes the others one place down
+                models.insert(0, {'uuid': 'new'})
+            return models[page * page_size:(page + 1) * page_size]
+        rv = iter_pages(fetch, page_size=2, prefetch=0)
+        # the model pushed onto the second page is not repeated, nor the list cut short
+        assert [e['uuid'] for e in rv] == ['0', '1', '2', '3', '4', '5']
+
+    def test_iter_capped_page_size(self):
+        items = list(range(7))
+        sizes = []
+
+        def fetch(page, page_size):
+            sizes.append(page_size)
+            # the server answers at most 3 items whatever the page size asked for
+            page_size = min(page_size, 3)
+            return items[page * page_size:(page + 1) * page_size]
+        assert list(iter_pages(fetch, page_size=5, prefetch=0)) == items
+        assert sizes == [5, 3, 3]
+
+        # a whole list shorter than the page size costs one more request
+        assert list(iter_pages(lambda page, page_size: items[page * page_size:][:page_size], 10, 0)) == items
+
+    def test_iter_tables(self, v1_api):
+        rv = self.project.service.iter_tables()
+        assert len(list(rv)) == 6
+
     def test_cube_desc(self, v1_api):
         rv = self.project.service.cube_desc('kylin_sales_cube', headers={})
         assert 'dimensions' in rv
@@ -77,6 +130,14 @@ class TestKylinService(object):
         assert 'columnMetas' in rv
         assert 'results' in rv
 
+    def test_query_stream(self, v1_api):
+        rv = self.project.service.query(sql='select count(*) from kylin_sales', stream=True)
+        assert rv.column_metas[0]['columnTypeName']
+        rows = list(rv)
+        assert rows == self.project.service.query(sql='select count(*) from kylin_sales')['results']
+        assert 'results' not in rv.meta
+        assert rv.meta['columnMetas'] == rv.column_metas
+
     def test_error_query(self, mocker):
         mocker.patch('kylinpy.service.KylinService.api.query', return_value={'exceptionMessage': 'foobar'})
 
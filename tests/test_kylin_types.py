@@ -9,7 +9,7 @@ from datetime import date, datetime
 import pytest
 
 from kylinpy.exceptions import KylinUnsupportedType
-from kylinpy.utils.kylin_types import kylin_to_python
+from kylinpy.utils.kylin_types import converter, kylin_to_python, row_converter
 
 
 def test_kylin_types():
@@ -44,3 +44,17 @@ def test_kylin_types():
         == datetime(2001, 3, 10, 12, 12, 12)
     assert kylin_to_python('TIMESTAMP', '2001-03-10 12:12:12.000000') \
         == datetime(2001, 3, 10, 12, 12, 12)
+
+
+def test_row_converter():
+    convert = row_converter(['varchar(256)', 'bigint not null', 'decimal(19, 4)', 'date'])
+    assert convert(['abc', '3', '1.5', '2012-01-01']) == ('abc', 3, 1.5, date(2012, 1, 1))
+    assert convert(['', None, None, '']) == ('', None, None, '')
+    # string-only results are not converted cell by cell
+    assert row_converter(['varchar', 'char(2)']) is tuple
+    assert converter('STRING')('abc') == 'abc'
+
+    unsupported = converter('UnsupportedType')
+    assert unsupported(None) is None
+    with pytest.raises(KylinUnsupportedType):
+        unsupported('abc')
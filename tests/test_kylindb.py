@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import threading
+
+import pytest
+
+from kylinpy.exceptions import KylinQueryError
+from kylinpy.kylindb import Connection
+
+
+class TestCursor(object):
+    def connect(self, **kwargs):
+        return Connection.connect(
+            host='example', username='ADMIN', password='KYLIN', project='learn_kylin', **kwargs)
+
+    @pytest.mark.parametrize('stream_results', ['0', '1'])
+    def test_execute(self, v1_api, stream_results):
+        cursor = self.connect(stream_results=stream_results).cursor()
+        cursor.execute('select count(*) from kylin_sales')
+        assert cursor.description[0][:2] == ['EXPR$0', 'bigint']
+        assert cursor.fetchone() == (10000,)
+        assert cursor.fetchone() is None
+        assert cursor.fetched_rows == 1
+
+    def test_execute_stream(self, v1_api):
+        cursor = self.connect(stream_results=True).cursor()
+        cursor.execute('select count(*) from kylin_sales')
+        assert cursor.rowcount == -1
+        assert cursor.fetchall() == [(10000,)]
+        cursor.close()
+
+    @pytest.mark.parametrize('stream_results', ['0', '1'])
+    def test_fetchmany(self, v1_api, stream_results):
+        cursor = self.connect(stream_results=stream_results).cursor()
+        cursor.execute('select count(*) from kylin_sales')
+        assert cursor.fetchmany(10) == [(10000,)]
+        assert cursor.fetchmany(10) == []
+        assert cursor.fetchall() == []
+
+    def test_rows_converted_on_fetch(self, v1_api, mocker):
+        v1_api.patch('kylinpy.service.KylinService.api.query', return_value={
+            'columnMetas': [{
+                'label': 'ID', 'columnTypeName': 'BIGINT', 'displaySize': 19,
+                'precision': 19, 'scale': 0, 'isNullable': 0,
+            }],
+            'results': [[str(i)] for i in range(100)],
+        })
+        converted = []
+        mocker.patch('kylinpy.kylindb.row_converter', return_value=lambda row: converted.append(row) or int(row[0]))
+        cursor = self.connect().cursor()
+        cursor.execute('select id from kylin_sales')
+        assert cursor.rowcount == 100
+        assert converted == []
+        assert cursor.fetchone() == 0
+        assert cursor.fetchmany(2) == [1, 2]
+        assert len(converted) == 3
+        assert next(cursor) == 3
+        assert len(cursor.fetchmany(96)) == 96
+        assert list(cursor) == []
+        assert len(converted) == 100
+        # results still holds the converted rows
+        assert cursor.results == list(range(100))
+
+    def paged_query(self, v1_api, num_rows):
+        def query(client, endpoint, json):
+            offset, limit = json['offset'], json['limit']
+            return {
+                'columnMetas': [{
+                    'label': 'ID', 'columnTypeName': 'BIGINT', 'displaySize': 19,
+                    'precision': 19, 'scale': 0, 'isNullable': 0,
+                }],
+                'results': [[str(i)] for i in range(offset, min(offset + limit, num_rows))],
+            }
+        return v1_api.patch('kylinpy.service.KylinService.api.query', side_effect=query)
+
+    def test_execute_paged(self, v1_api):
+        query = self.paged_query(v1_api, 25)
+        cursor = self.connect(query_page_size=10).cursor()
+        cursor.execute('select id from kylin_sales order by id')
+        assert cursor.rowcount == -1
+        assert cursor.description[0][:2] == ['ID', 'bigint']
+        assert query.call_count == 1
+        assert cursor.fetchmany(10) == [(i,) for i in range(10)]
+        assert query.call_count == 1
+        assert cursor.fetchone() == (10,)
+        assert query.call_count == 2
+        assert [row[0] for row in cursor] == list(range(11, 25))
+        assert [(c[1]['json']['offset'], c[1]['json']['limit']) for c in query.call_args_list] == [
+            (0, 10), (10, 10), (20, 10)]
+
+    def test_execute_paged_full_last_page(self, v1_api):
+        query = self.paged_query(v1_api, 20)
+        cursor = self.connect(query_page_size=10).cursor()
+        cursor.execute('select id from kylin_sales order by id')
+        assert len(cursor.fetchall()) == 20
+        assert query.call_count == 3
+
+    def test_execute_paged_limits(self, v1_api, caplog):
+        query = self.paged_query(v1_api, 100)
+        cursor = self.connect(query_page_size=10, query_max_rows=25).cursor()
+        cursor.execute('select id from kylin_sales order by id', {'offset': 5})
+        assert [row[0] for row in cursor.fetchall()] == list(range(5, 30))
+        # one row more than max_rows tells whether the result was cut short
+        assert [c[1]['json']['limit'] for c in query.call_args_list] == [10, 10, 6]
+        assert 'max_rows=25' in caplog.text
+
+        caplog.clear()
+        cursor = self.connect(query_page_size=10, query_max_rows=100).cursor()
+        cursor.execute('select id from kylin_sales order by id')
+        assert len(cursor.fetchall()) == 100
+        assert 'max_rows' not in caplog.text
+
+        cursor.execute('select id from kylin_sales')
+        assert len(cursor.fetchall()) == 100
+        assert 'without an ORDER BY' in caplog.text
+
+        caplog.clear()
+        cursor.execute('select id from kylin_sales order by id', {'limit': 12})
+        assert len(cursor.fetchall()) == 12
+        assert 'max_rows' not in caplog.text
+
+    def test_execute_paged_prefetch(self, v1_api):
+        query = self.paged_query(v1_api, 35)
+        fetched = query.side_effect
+        requested = {}
+
+        def prefetched(client, endpoint, json):
+            requested.setdefault(json['offset'], threading.Event()).set()
+            return fetched(client, endpoint, json)
+
+        requested[20] = threading.Event()
+        query.side_effect = prefetched
+        cursor = self.connect(query_page_size=10, query_prefetch=2).cursor()
+        cursor.execute('select id from kylin_sales order by id')
+        assert cursor.fetchone() == (0,)
+        # pages 2 and 3 are fetched while page 1 is consumed
+        assert requested[20].wait(5)
+        assert sorted(requested) == [0, 10, 20]
+        assert [row[0] for row in cursor.fetchall()] == list(range(1, 35))
+
+    def test_execute_paged_prefetch_stops_at_end(self, v1_api):
+        query = self.paged_query(v1_api, 35)
+        cursor = self.connect(query_page_size=10, query_prefetch=1).cursor()
+        cursor.execute('select id from kylin_sales order by id')
+        assert len(cursor.fetchall()) == 35
+        # no page past the short last one is requested ahead
+        assert sorted(c[1]['json']['offset'] for c in query.call_args_list) == [0, 10, 20, 30]
+
+    def test_execute_paged_prefetch_error(self, v1_api):
+        query = self.paged_query(v1_api, 100)
+        fetched = query.side_effect
+
+        def failing(client, endpoint, json):
+            if json['offset'] == 20:
+                raise KylinQueryError('page 3 failed')
+            return fetched(client, endpoint, json)
+
+        query.side_effect = failing
+        cursor = self.connect(query_page_size=10, query_prefetch=3).cursor()
+        cursor.execute('select id from kylin_sales order by id')
+        assert len(cursor.fetchmany(20)) == 20
+        with pytest.raises(KylinQueryError):
+            cursor.fetchone()
+
+    def test_executemany(self, v1_api):
+        cursor = self.connect().cursor()
+        cursor.executemany('select count(*) from kylin_sales', [{}, {}])
+        assert cursor.rowcount == 2
+        assert cursor.fetchall() == [(10000,), (10000,)]
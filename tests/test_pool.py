@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import threading
+
+import pytest
+
+from kylinpy.client import Client
+from kylinpy.client.pool import ConnectionPool, PoolManager, get_ssl_context
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.peers.add(self.client_address)
+        body = json.dumps({'path': self.path}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = HTTPServer(('127.0.0.1', 0), _Handler)
+    httpd.peers = set()
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+class _FakeConnection(object):
+    sock = None
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_ssl_context_is_shared():
+    assert get_ssl_context(True) is get_ssl_context(True)
+    assert get_ssl_context(False) is get_ssl_context(False)
+    assert get_ssl_context(True) is not get_ssl_context(False)
+
+
+def test_pool_maxsize():
+    pool = ConnectionPool('http', 'example:7070', maxsize=1)
+    conns = [_FakeConnection(), _FakeConnection()]
+    for conn in conns:
+        pool.put(conn)
+    assert pool.num_idle == 1
+    assert conns[1].closed is True
+
+    conn, is_reused = pool.get()
+    assert conn is conns[0]
+    assert is_reused is True
+
+
+def test_pool_idle_timeout(mocker):
+    pool = ConnectionPool('http', 'example:7070', maxsize=2, idle_timeout=10)
+    conn = _FakeConnection()
+    mocker.patch('kylinpy.client.pool.time.time', return_value=100)
+    pool.put(conn)
+    mocker.patch('kylinpy.client.pool.time.time', return_value=111)
+    _conn, is_reused = pool.get()
+    assert is_reused is False
+    assert _conn is not conn
+    assert conn.closed is True
+
+
+def test_pool_manager_per_host():
+    manager = PoolManager(maxsize=3)
+    pool = manager.connection_pool('http', 'foo:7070')
+    assert manager.connection_pool('http', 'foo:7070') is pool
+    assert manager.connection_pool('http', 'bar:7070') is not pool
+    assert pool.maxsize == 3
+    manager.clear()
+    assert manager.pools == []
+
+
+def test_keep_alive_reuses_connection(server):
+    host = 'http://127.0.0.1:{}'.format(server.server_address[1])
+    pool = PoolManager()
+    client = Client(host=host, pool=pool)
+    for i in range(3):
+        assert client.get('/foo/{}'.format(i)).json() == {'path': '/foo/{}'.format(i)}
+
+    assert len(server.peers) == 1
+    (_pool,) = pool.pools
+    assert _pool.num_connections == 1
+    assert _pool.num_requests == 3
+    assert _pool.num_idle == 1
+    client.close()
+    assert _pool.num_idle == 0
+
+
+def test_keep_alive_disabled(server):
+    host = 'http://127.0.0.1:{}'.format(server.server_address[1])
+    client = Client(host=host, keep_alive=False)
+    for i in range(2):
+        assert client.get('/foo').json() == {'path': '/foo'}
+    assert len(server.peers) == 2
+    assert client.pool is None
+
+
+def test_preconnect(server):
+    host = 'http://127.0.0.1:{}'.format(server.server_address[1])
+    client = Client(host=host, pool=PoolManager(maxsize=3))
+    assert client.preconnect(5) == 3
+    assert client.preconnect(2) == 0
+    (pool,) = client.pool.pools
+    assert (pool.num_connections, pool.num_requests, pool.num_idle) == (3, 0, 3)
+    client.close()
+
+    assert client.preconnect() == 1
+    assert client.get('/foo').json() == {'path': '/foo'}
+    (pool,) = client.pool.pools
+    assert (pool.num_connections, pool.num_requests) == (1, 1)
+    client.close()
+    assert Client(host=host, keep_alive=False).preconnect() == 0
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import threading
+
+import pytest
+
+from kylinpy import kylindb
+from kylinpy.client import Client
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+THREADS = 16
+REQUESTS = 25
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = json.dumps({
+            'path': self.path,
+            'request_id': self.headers.get('X-Request-Id'),
+            'authorization': self.headers.get('Authorization'),
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def server():
+    httpd = _ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _hammer(get_client):
+    mismatches = []
+    errors = []
+    start = threading.Event()
+
+    def worker(i):
+        start.wait()
+        try:
+            for j in range(REQUESTS):
+                request_id = '{}-{}'.format(i, j)
+                rv = get_client().get(
+                    '/echo', params={'id': request_id}, headers={'X-Request-Id': request_id}).json()
+                if rv['request_id'] != request_id or not rv['path'].endswith('id=' + request_id):
+                    mismatches.append((request_id, rv))
+        except Exception as err:
+            errors.append(err)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    start.set()
+    for thread in threads:
+        thread.join()
+    return mismatches, errors
+
+
+def test_shared_client(server):
+    headers = {'User-Agent': 'Kylin Python Client'}
+    client = Client('http://127.0.0.1:{}'.format(server.server_port), request_headers=headers)
+    mismatches, errors = _hammer(lambda: client)
+    pool, = client.pool.pools
+    client.close()
+    assert errors == []
+    assert mismatches == []
+    # per-call headers never leak into the shared ones
+    assert client.request_headers == {'User-Agent': 'Kylin Python Client'}
+    assert pool.num_requests == THREADS * REQUESTS
+    assert pool.num_connections <= THREADS
+
+
+def test_shared_connection(server):
+    conn = kylindb.Connection.connect(host='127.0.0.1', port=server.server_port, username='ADMIN', password='KYLIN')
+    mismatches, errors = _hammer(lambda: conn.service.client)
+    conn.close()
+    assert errors == []
+    assert mismatches == []
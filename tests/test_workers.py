@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import threading
+import time
+
+import pytest
+
+from kylinpy.utils.workers import ConcurrentMap, map_concurrently
+
+
+def test_map_concurrently():
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def work(i):
+        with lock:
+            running.append(i)
+            peak.append(len(running))
+        time.sleep(0.01)
+        with lock:
+            running.remove(i)
+        return i * 2
+
+    assert map_concurrently(work, range(10), max_workers=3) == [i * 2 for i in range(10)]
+    assert max(peak) == 3
+    assert map_concurrently(work, []) == []
+
+
+def test_map_concurrently_error():
+    done = []
+
+    def work(i):
+        if i == 1:
+            raise ValueError(i)
+        done.append(i)
+
+    with pytest.raises(ValueError):
+        map_concurrently(work, range(5), max_workers=2)
+    # the other items still ran
+    assert sorted(done) == [0, 2, 3, 4]
+
+
+def test_concurrent_map():
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def work(i):
+        with lock:
+            running.append(i)
+            peak.append(len(running))
+        time.sleep(0.01 * (5 - i % 5))
+        with lock:
+            running.remove(i)
+        return i * 2
+
+    assert list(ConcurrentMap(work, range(10), max_workers=3)) == [i * 2 for i in range(10)]
+    assert max(peak) == 3
+    assert list(ConcurrentMap(work, [])) == []
+
+
+def test_concurrent_map_takes_items_as_consumed():
+    taken = []
+
+    def items():
+        for i in range(100):
+            taken.append(i)
+            yield i
+
+    results = ConcurrentMap(lambda i: i, items(), max_workers=2)
+    assert next(results) == 0
+    time.sleep(0.05)
+    # one result consumed, two taken ahead
+    assert taken == [0, 1, 2]
+    results.close()
+    time.sleep(0.05)
+    assert taken == [0, 1, 2]
+    assert list(results) == []
+
+
+def test_concurrent_map_error():
+    def work(i):
+        if i == 1:
+            raise ValueError(i)
+        return i
+
+    results = ConcurrentMap(work, range(5), max_workers=2)
+    assert next(results) == 0
+    with pytest.raises(ValueError):
+        next(results)
+    assert list(results) == [2, 3, 4]
+
+
+class _Abort(BaseException):
+    pass
+
+
+def test_concurrent_map_base_exception():
+    def work(i):
+        if i == 1:
+            raise _Abort()
+        return i
+
+    results = ConcurrentMap(work, range(3), max_workers=2)
+    assert next(results) == 0
+    # raised to the consumer instead of leaving it waiting for the result
+    with pytest.raises(_Abort):
+        next(results)
+    assert list(results) == [2]
+
+    def items():
+        yield 0
+        raise ValueError('no more items')
+
+    results = ConcurrentMap(lambda i: i, items(), max_workers=2)
+    assert next(results) == 0
+    with pytest.raises(ValueError):
+        next(results)
+    assert list(results) == []